@@ -1,8 +1,8 @@
 import pandas as pd
-from cmath import pi, exp
 from math import log2, ceil
 from bokeh.plotting import figure, show, output_file
 from bokeh.models import Range1d
+from vibration_analysis import fft
 
 
 def nxt_power_2(x):
@@ -19,18 +19,6 @@ def zero_padding(array):
             array.append(0)
 
 
-def fft(x):
-    # Calculates and returns the Discrete Fourier Transform using Cooley-Tukey's algorithm
-    length = len(x)
-    if length <= 1:
-        return x
-    even_terms = fft(x[0::2])
-    odd_terms = fft(x[1::2])
-    fourier = [exp(-2j * pi * p / length) * odd_terms[p] for p in range(length // 2)]
-    return [even_terms[p] + fourier[p] for p in range(length // 2)] + \
-           [even_terms[p] - fourier[p] for p in range(length // 2)]
-
-
 input_data_path = "Data/Vibration Data - Modified.xlsx"
 output_data_path = "Data/Fourier transformed Vibration Data.xlsx"
 vibration_data = pd.read_excel(input_data_path)
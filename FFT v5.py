@@ -10,302 +10,127 @@ Change the following paths for getting the input file and saving the output:
     1. vibration_input_path: Path to an EXCEL FILE containing the required vibration Data
     2. output_path: Path to a FOLDER where you want the final graphs and excel sheet to be saved
 
+The settings of the analysis follow the paths. The analysis itself is run() in vibration_analysis/cli.py, and the
+functions it uses (fft, nxt_power_2, zero_pad, peak_pos, ...) can be imported from the vibration_analysis package
+without running anything.
+
 Before running the file, please check if you already installed the required libraries or packages.
     The required external libraries to be installed are:
         1. Pandas
         2. bokeh
         3. xlsxwriter
         4. xlrd
+        5. numpy
+        6. openpyxl
 
     If they are not installed, open command prompt and use these commands to install them:
         1. pip install pandas
         2. pip install bokeh
         3. pip install xlsxwriter
         4. pip install xlrd
+        5. pip install numpy
+        6. pip install openpyxl
 
     You can use the same command 'pip install {library name}' to install other libraries if you want.
 
 """
 
-import pandas as pd                                      # To read and write excel files
-from cmath import pi, exp                                # To calculate the Fourier Transform
-from math import log2, ceil                              # To find the next higher power of 2
-from bokeh.plotting import figure, show, output_file     # To plot the figure, show the result and to save the output
-from bokeh.models import Range1d                         # To fix the axis range in the final plot
-from datetime import datetime                            # To get the date and time to prevent overwriting of files
-import os                                                # To create directories to save files if it doesn't exist
-
-
-def nxt_power_2(x):
-    """
-    Returns the next higher power of 2 closest to the given number
-
-    parameter:
-    x(Int): An integer whose next higher power of 2 we want to find
-
-    Returns:
-    Int: An integer which is a power of 2 that is closest and larger than x
-
-    Explanation:
-    Consider nxt_power_2(100).
-
-    log2(x) gives the log value of x, log2(100) returns 6.643856189774724
-    ceil(x) gives the smallest integer greater than x, ceil(6.643856189774724) returns 7
-    Now, 2^7 returns 128, thus 128 is the next power of 2 closest to 100.
-
-
-    examples:
-    if x = 10, nxt_power_2(x) returns 16.
-    if x = 1000, nxt_power_2(x) returns 1024.
-    if x = 64, nxt_power_2(x) returns 64.
-
-    """
-    return 2**ceil(log2(x))
-
-
-def zero_pad(arr):
-    """
-    Adds a series of 0s to the end of signal such that signal length becomes a power of 2
-
-    Parameter:
-    arr(Array): An array of any length
-
-    Returns:
-    Array: An array of length 2^x
-
-    Explanation:
-    The next closest power of 2 is found for the length of the input array.
-
-    If the length of the array is same as the next power, then the array doesn't need to be altered.
-
-    If the length is not a power of 2, then the difference is found,
-     and that many zeros are added to the end of the array.
-
-    Then the array with a length of a power of 2 (either with zeros appended or not) is returned.
-
-    example:
-    if array = [1, 2, 3, 4, 5] which of length 5(not a power of 2),
-        the function returns [1, 2, 3, 4, 5, 0, 0, 0] which is of length 8(power of2)
-
-    if array = [2, 5, 9, 7] which is of length 4(already a power of 2),
-        the function returns the same [2, 5, 9, 7]
-
-    """
-    nextpwr = nxt_power_2(len(arr))
-    length_of_array = len(arr)
-    if nextpwr != length_of_array:
-        for j in range(nextpwr-length_of_array):
-            arr.append(0)
-    return arr
-
-
-def fft(x):
-    """
-    Calculates and returns the Discrete Fourier Transform using Cooley-Tukey's algorithm
-
-    Parameter:
-    x(Array): An array whose length n, is a power of 2
-
-    Returns:
-    Array: An array of complex numbers having length n after calculating the Fourier Transform
-
-    """
-    length = len(x)
-    if length <= 1:
-        return x
-    even_terms = fft(x[0::2])
-    odd_terms = fft(x[1::2])
-    fourier = [exp(-2j * pi * p / length) * odd_terms[p] for p in range(length // 2)]
-    return [even_terms[p] + fourier[p] for p in range(length // 2)] + \
-           [even_terms[p] - fourier[p] for p in range(length // 2)]
-
-
-def peak_pos(y_axis, x_axis):
-    """
-    Identifies the peaks from the data and returns the position of the peak(Freq) and also the Amplitude of the peak
-
-    Parameters:
-    y_axis(Array): An array containing the y_axis coordinates
-    x_axis(Array): An array containing the x_axis coordinates
-
-    Returns:
-    Array: An array containing the position of the peak as an ordered pair of the form (x, y)
-
-    Explanation:
-    A point in the graph is identified as a peak when the values both preceding and succeeding it
-     are smaller compared to itself. This is a local maxima.
-
-    The index i of the local maxima is found from the y_axis array, then the ordered pair is constructed with y_axis[i]
-    and x_axis[i] and appended to a list.
-
-    Then the list is returned, if there is no peak in the given input sets, then an empty array is returned.
-
-    Example:
-    peak_pos([10, 20, 30, 25, 20, 10], [1, 2, 3, 4, 5, 6]) returns [(3, 30)]
-
-    """
-    peaks = []
-    length = len(y_axis)
-    mean = sum(y_axis)/length
-    # stdev = sqrt(sum(pow(x-mean, 2)/length for x in y_axis))
-    for j in range(1, len(y_axis)-1):
-        if y_axis[j] > mean and y_axis[j-1] < y_axis[j] > y_axis[j+1]:
-            x_value = round(x_axis[j], 2)
-            y_value = round(y_axis[j], 2)
-            if y_value != 0:
-                peaks.append((x_value, y_value))
-    return peaks
-    # Returns a list of tuples containing an ordered pair of amplitude and frequency
+from vibration_analysis.cli import run                  # The analysis itself, see vibration_analysis/cli.py
 
 
 vibration_input_file = "Vibration Data/Vibration Data - Modified.xlsx"     # Read the input excel file at this location
 output_path = "Output Files/"                                              # Save the Output file at this location
-
-if not os.path.exists(output_path):                 # Check if the given path already exists
-    os.makedirs(output_path)                        # Create a new directory if it doesn't exist
-
-
-time = datetime.now().strftime("%d-%m-%y   -   %H-%M-%S")                 # Get the current time and date
-excel_path = output_path + time + '/' + 'Excel/'                          # Path created for a folder with given time
-graph_path = output_path + time + '/' + 'Graph/'
-
-if not os.path.exists(output_path + time + '/'):
-    os.makedirs(excel_path)                                 # Create a new directory for excel sheets
-    os.makedirs(graph_path)                                 # Create a new directory for graphs
-
-
-vibration_data = pd.read_excel(vibration_input_file)        # Read the excel file as input
-
-# Separating the values of X and Y axis data
-vibraX = pd.DataFrame(vibration_data, columns=['VibraX'])   # Separate the values under the column name 'VibraX'
-vibraY = pd.DataFrame(vibration_data, columns=['VibraY'])
-
-
-# Converting dataframes in to a python list
-vibraY = vibraY.values.tolist()
-vibraX = vibraX.values.tolist()
+cache_path = "Cache/"                                                      # Keep the parsed input files at this location
 
 
 # To limit the number or samples
 length_fixed = 1024
 
 
-# To calculate the sum of the data
-sum_x, sum_y = 0, 0
-for i in range(length_fixed):
-    sum_y += vibraY[i][0]
-    sum_x += vibraX[i][0]
-
+# How the signal is zero padded before the FFT
+#   "pad": up to the next power of 2, "native": no padding, "fast": up to the next length made of 2, 3 and 5,
+#   "auto": whichever of those is the cheapest to calculate
+padding_mode = "pad"
 
-# To calculate the mean of the data
-mean_x = sum_x / length_fixed
-mean_y = sum_y / length_fixed
 
+# Window applied to the samples before the FFT, to reduce the leakage of every peak into the bins around it
+#   "rectangular": no window, "hann", "hamming", "blackman", "flattop" (the most accurate peak amplitudes)
+# The amplitudes are corrected for the window, so a peak has the same height with every window
+window_type = "rectangular"
 
-# Mean is subtracted from the data to remove the DC offset (Peak appearing at 0Hz, though there is no DC component)
-x_list, y_list = [], []
-for i in range(length_fixed):
-    x_list.append(vibraX[i][0] - mean_x)
-    y_list.append(vibraY[i][0] - mean_y)
 
+# Peaks printed at the end: at most peak_count of the highest peaks (None for all of them) above the noise floor,
+# of which no two are closer than peak_distance bins
+peak_count = 10
+peak_distance = 3
 
-# Zeroes are added to the end of the signal
-x_list = zero_pad(x_list)
-y_list = zero_pad(y_list)
 
-
-Fs = 1                          # Sampling Frequency of the signal
-n = len(x_list)                 # Number of samples
-k = [i for i in range(n)]       # List of values from 0 to n [0, 1, 2, .... 4093, 4094, 4095]
-T = n / Fs                      # Total time = No of sample/Sample frequency
-frq = [x / T for x in k]        # Frequency range up to Fs/2 (from 0 Hz to 0.5 Hz)
-frq = frq[:len(frq) // 2]       # Only first half is taken, because FFT output will be symmetrical
+# The frequencies of the peaks are those of their bins, Fs / n apart. They can be estimated between the bins instead:
+#   None: the frequency of the bin, "parabolic": good with a window (see window_type),
+#   "quinn" or "jacobsen": almost exact for the rectangular window
+# This is much cheaper than zero padding to many times length_fixed to get finer bins
+peak_interpolation = None
 
 
-# FFT is applied on the X-Axis data, and then normalised by dividing the number of data elements
-fourier_x_list = fft(x_list)
-abs_fourier_x = [abs(x) / len(fourier_x_list) for x in fourier_x_list]
-power_fourier_x = [(abs(x) / len(fourier_x_list))**2 for x in fourier_x_list]
+# How the power spectrum is calculated
+#   "periodogram": from the single FFT of the first length_fixed samples
+#   "welch": averaged over overlapping, windowed segments of the same length taken from the whole recording,
+#            which gives a much less noisy spectrum for long recordings
+power_mode = "periodogram"
 
 
-# FFT is applied on the Y-Axis data, and then normalised
-fourier_y_list = fft(y_list)
-abs_fourier_y = [abs(y) / len(fourier_y_list) for y in fourier_y_list]
-power_fourier_y = [(abs(y) / len(fourier_y_list))**2 for y in fourier_y_list]
+# Set to True for run up and coast down tests, to also plot the spectrum over time (spectrogram) of the whole recording
+plot_spectrogram = False
+spectrogram_hop = 256           # Number of samples between two spectra of the spectrogram
 
 
-# Only the left is taken as the output of FT will be symmetrical
-final_fourier_x = abs_fourier_x[:len(abs_fourier_x) // 2]
-final_fourier_y = abs_fourier_y[:len(abs_fourier_y) // 2]
+# Set to a (low, high) band in Hz to also plot the spectrum of only that band, with zoom_bins bins across it.
+# The bins can be much closer than Fs / n, without zero padding the whole spectrum, e.g. zoom_band = (0.10, 0.15)
+zoom_band = None
+zoom_bins = 1000
 
 
-final_fourier_pwr_x = power_fourier_x[:len(power_fourier_x) // 2]
-final_fourier_pwr_y = power_fourier_y[:len(power_fourier_y) // 2]
+# Formats the spectra are saved in, in the Excel folder: "excel" (as before), "csv", "npz", "npy", "parquet", "hdf5"
+# The binary formats are much faster to write and read back for long spectra
+output_formats = ["excel"]
 
 
-# FT data is converted to data frame
-outX = pd.DataFrame({"Fourier_X": final_fourier_x})
-outY = pd.DataFrame({"Fourier_Y": final_fourier_y})
-outPowerX = pd.DataFrame({"FourierPower_X": final_fourier_pwr_x})
-outPowerY = pd.DataFrame({"FourierPower_Y": final_fourier_pwr_y})
+# The plots keep the smallest and largest value of every pixel column only, so long spectra give small html files
+# Every level of detail lets the plot be zoomed in 4 times more without losing a bin, 0 for none
+plot_levels = 0
 
 
-# The excel file writer is defined along with the filename and path
-writer = pd.ExcelWriter(excel_path + "Fourier transformed Data.xlsx", engine='xlsxwriter')
+# All the plots are saved in one report, Graph/Report.html. True only saves it, e.g. when running on a server.
+headless = False
 
 
-# The data frame is now written into an excel sheet
-outX.to_excel(writer, sheet_name="sheet1")
-outY.to_excel(writer, startcol=2, index=False, sheet_name='sheet1')
-outPowerX.to_excel(writer, startcol=3, index=False, sheet_name='sheet1')
-outPowerY.to_excel(writer, startcol=4, index=False, sheet_name='sheet1')
-writer.save()
+# Records the time taken by every stage of the run in 'Run record.json', in the output folder
+# None (off), "time", "memory" (also the peak memory of every stage, slower) or "profile" (also a cProfile profile)
+instrument_mode = None
 
 
-output_file(graph_path + "FFT_x.html")     # Name of the output file at the predefined path
-plot = figure(title="Vibration X fft - {} samples".format(length_fixed),
-              x_axis_label='Frequency (Hz)',
-              y_axis_label='Amplitude (g)',
-              y_range=Range1d(-0.005, 1),   # Change this to alter the min and max value in Y axis
-              plot_width=1500,              # Width of the plot
-              plot_height=700)              # Height of the plot
-plot.line(frq, final_fourier_x)             # To plot the graph
-show(plot)                                  # To open and display the plotted graph
+# Trend removed from the samples before the FFT: "constant" (the mean, as before), "linear" (a drift of the sensor),
+# the degree of a polynomial (e.g. 2), or None
+detrend = "constant"
 
 
-output_file(graph_path + "FFT_y.html")
-plot = figure(title="Vibration Y fft - {} samples".format(length_fixed),
-              x_axis_label='Frequency (Hz)',
-              y_axis_label='Amplitude (g)',
-              y_range=Range1d(-0.005, 3),   # Change this to alter the min and max value in Y axis
-              plot_width=1500,
-              plot_height=700)
-plot.line(frq, final_fourier_y)
-show(plot)
+# "double" as before, or "single" to keep the samples and spectra in float32 / complex64: half the memory, and
+# still more precise than the 16 or 24 bits of the accelerometers (see vibration_analysis/fourier.py)
+precision = "double"
 
 
-output_file(graph_path + "FFT_Power_x.html")
-plot = figure(title="Vibration X fft Power - {} samples".format(length_fixed),
-              x_axis_label='Frequency (Hz)',
-              y_axis_label='Amplitude (g)',
-              y_range=Range1d(-0.005, 1),   # Change this to alter the min and max value in Y axis
-              plot_width=1500,
-              plot_height=700)
-plot.line(frq, final_fourier_pwr_x)
-show(plot)
+Fs = 1                          # Sampling Frequency of the signal
 
 
-output_file(graph_path + "FFT_Power_y.html")
-plot = figure(title="Vibration Y fft Power - {} samples".format(length_fixed),
-              x_axis_label='Frequency (Hz)',
-              y_axis_label='Amplitude (g)',
-              y_range=Range1d(-0.005, 3),   # Change this to alter the min and max value in Y axis
-              plot_width=1500,
-              plot_height=700)
-plot.line(frq, final_fourier_pwr_y)
-show(plot)
+# The y axis of the plots of every axis is fixed to (min, max), change these to alter them
+y_ranges = {"X": (-0.005, 1), "Y": (-0.005, 3)}
 
 
-# Print the positions of the peaks
-print("Peaks in Y axis \n (Frq, Amp)\n", peak_pos(final_fourier_pwr_y, frq))
-print("Peaks in X axis \n (Frq, Amp)\n", peak_pos(final_fourier_pwr_x, frq))
+# Reads the file, writes the excel sheet and the graphs into output_path/<time>/, opens the graphs and prints the peaks
+if __name__ == "__main__":
+    run(vibration_input_file, output_path=output_path, cache_path=cache_path, columns=["VibraX", "VibraY"],
+        length_fixed=length_fixed, padding_mode=padding_mode, window_type=window_type, peak_count=peak_count,
+        peak_distance=peak_distance, peak_interpolation=peak_interpolation, power_mode=power_mode,
+        plot_spectrogram=plot_spectrogram, spectrogram_hop=spectrogram_hop, zoom_band=zoom_band, zoom_bins=zoom_bins,
+        fs=Fs, y_ranges=y_ranges, output_formats=output_formats, plot_levels=plot_levels, headless=headless,
+        instrument_mode=instrument_mode, detrend=detrend, precision=precision)
@@ -1,7 +1,7 @@
-from cmath import pi, exp
 from math import log2, ceil
 from bokeh.plotting import figure, show, output_file
 import numpy as np
+from vibration_analysis import fft
 
 
 def nxt_power_2(x):
@@ -16,17 +16,6 @@ def zero_padding(array):
             array.append(0)
 
 
-def fft(x):
-    n = len(x)
-    if n <= 1:
-        return x
-    even_terms = fft(x[0::2])
-    odd_terms = fft(x[1::2])
-    t = [exp(-2j * pi * k / n) * odd_terms[k] for k in range(n // 2)]
-    return [even_terms[k] + t[k] for k in range(n // 2)] +\
-           [even_terms[k] - t[k] for k in range(n // 2)]
-
-
 def find_peaks(arr):
     peak_indices = []
     mean = sum(arr)/len(arr)
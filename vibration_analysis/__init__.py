@@ -0,0 +1,59 @@
+"""
+Vibration Analysis library
+
+The number crunching parts of the 'FFT v*.py' scripts live here, so that they can be shared by all the scripts
+instead of being copied from one file to the next.
+
+    1. fourier: Fast Fourier Transform of any length, for complex and real signals, one or many channels at once
+    2. plan: Cache of precomputed twiddle factors and bit reversed orders for every transform length
+    3. ingest: Reads the columns of excel and csv files block by block (needs NumPy)
+    4. cache: Keeps parsed input files on disk as memory mapped binary recordings (needs NumPy)
+    5. spectral: Welch averaged power spectra and spectrograms (STFT) of long recordings (needs NumPy)
+    6. windows: Hann, Hamming, Blackman and flat top windows with their correction factors (needs NumPy)
+    7. peaks: Finds the peaks of spectra, with noise floor, prominence, distance and top-K selection (needs NumPy)
+    8. zoom: Spectrum of a narrow frequency band only, with the chirp-z transform (needs NumPy)
+    9. tracking: Direct and sliding DFT amplitudes of a few frequencies, updated sample by sample (needs NumPy)
+    10. plotting: Bokeh plots of spectra and spectrograms, decimated to the pixels of the plot (needs Bokeh)
+    11. pipeline: The analysis of 'FFT v5.py' as a function, analyse_file() writes one file's excel sheet and plots
+    12. watch: Service which analyses every file put into a folder, python -m vibration_analysis.watch <folder>
+    13. batch: Analyses many files in parallel processes, python -m vibration_analysis.batch "<folder>/*.xlsx"
+    14. writers: Writes the spectra as excel, csv, npz, npy, parquet or hdf5 files in a single pass
+    15. cli: The analysis of 'FFT v5.py', run() and main(), python -m vibration_analysis <file>
+    16. instrument: Time, memory and cProfile records of the stages of a run, saved next to its outputs
+    17. benchmark: Times every stage against NumPy and pandas, saves JSON and fails on a regression,
+        python -m vibration_analysis.benchmark --baseline <file.json>
+    18. preprocess: Mean, linear or polynomial trend removal, window and zero padding in one preallocated buffer
+    19. recording: Memory maps interleaved int16/int24/int32/float binary recordings, and csv sidecars of them
+
+NumPy is used when it is installed. Without NumPy the Fourier Transform runs on plain python lists.
+
+Importing the package only loads the Fourier Transform. The names of the other modules listed in _LAZY (peak_pos,
+read_samples, welch, run, ...) can be imported from the package too, their module is only loaded when they are first
+used, so pandas and Bokeh are never loaded for a compute only import. Nothing is run when the package is imported.
+
+"""
+
+from importlib import import_module                      # To load the other modules when their names are first used
+
+from vibration_analysis.fourier import fft, rfft, choose_length, next_fast_length, nxt_power_2, zero_pad, \
+    PADDING_MODES
+from vibration_analysis.plan import get_plan, set_plan_cache_limit, clear_plan_cache, plan_cache_info
+
+
+_LAZY = {
+    "read_samples": "ingest", "iter_blocks": "ingest", "open_recording": "recording",
+    "welch": "spectral", "stft": "spectral", "spectrogram": "spectral",
+    "get_window": "windows", "apply_window": "windows", "preprocess": "preprocess",
+    "find_peaks": "peaks", "refine_peaks": "peaks", "peak_pos": "peaks",
+    "zoom_fft": "zoom", "SlidingDFT": "tracking", "dft_bins": "tracking",
+    "write_results": "writers", "analyse_file": "pipeline", "run": "cli", "main": "cli",
+}
+
+
+def __getattr__(name):
+    # Called only for names which are not defined yet, see _LAZY
+    if name in _LAZY:
+        value = getattr(import_module("vibration_analysis." + _LAZY[name]), name)
+        globals()[name] = value                          # Later uses don't come here again
+        return value
+    raise AttributeError("module 'vibration_analysis' has no attribute '{}'".format(name))
@@ -0,0 +1,3 @@
+from vibration_analysis.cli import main
+
+main()
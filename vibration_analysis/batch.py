@@ -0,0 +1,155 @@
+"""
+Batch analysis of many recordings in parallel
+
+'FFT v5.py' analyses the one file in vibration_input_file. A month of recordings means running it hundreds of times,
+one after the other, on one core. run_batch() analyses a list of files with a pool of worker processes instead:
+
+    1. The files are given as glob patterns ("Vibration Data/*.xlsx") and/or a manifest, a text file with one path
+       per line
+    2. Every file is analysed by pipeline.analyse_file() in one of the worker processes, into its own
+       Output Files/<time>/Excel|Graph folder
+    3. One summary of all the files (peaks, time taken, errors) is written as a csv file in a folder of its own
+
+Parsing the excel files is pure python, so processes (not threads) are needed to use all the cores. The FFT plan and
+window of the analysis are built before the pool is started, so the workers inherit them where processes are forked,
+and build them once per worker otherwise.
+
+    python -m vibration_analysis.batch "Vibration Data/*.xlsx" --workers 8
+
+"""
+
+import argparse                                          # To read the options from the command line
+from concurrent.futures import ProcessPoolExecutor, as_completed   # To analyse the files in parallel
+import csv                                               # To write the summary
+import glob                                              # To find the files matching a pattern
+import os                                                # To count the cores
+import time                                              # To measure the time every file takes
+
+from vibration_analysis.cli import add_analysis_options, analysis_settings
+from vibration_analysis.fourier import choose_length
+from vibration_analysis.pipeline import analyse_file, output_folder
+from vibration_analysis.plan import get_plan
+from vibration_analysis.windows import get_window
+
+
+def collect_files(patterns=(), manifest=None):
+    """
+    Returns the files matching the glob patterns and listed in the manifest, each only once, in a stable order
+
+    Parameters:
+    patterns(List): Glob patterns, "**" matches any number of sub folders
+    manifest(String): Path to a text file with one file per line. Empty lines and lines starting with # are skipped.
+
+    Returns:
+    List: Paths of the files
+
+    """
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)))
+    if manifest is not None:
+        with open(manifest) as lines:
+            files.extend(line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#"))
+    return list(dict.fromkeys(files))                    # Duplicates removed, the first position is kept
+
+
+def _warm_up(length_fixed, padding_mode, window_type, precision="double"):
+    # Builds the plan and window every analysis needs, so that no file pays for them
+    get_plan(choose_length(length_fixed, padding_mode), precision)
+    get_window(window_type, length_fixed)
+
+
+def _analyse(path, settings):
+    start = time.perf_counter()
+    try:
+        result = analyse_file(path, **settings)
+    except Exception as error:                           # One bad file must not stop the batch
+        result = {"file": path, "error": repr(error)}
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def write_summary(path, results, columns):
+    """
+    Writes one row per analysed file: its output folder, the time taken, any error and the peaks of every column
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["File", "Output", "Samples", "FFT length", "Seconds", "Error"] +
+                        ["Peaks " + column + " (Frq, Amp)" for column in columns])
+        for result in results:
+            peaks = result.get("peaks", {})
+            peaks = [" ".join("({}, {})".format(*peak) for peak in peaks.get(column, [])) for column in columns]
+            writer.writerow([result["file"], result.get("output", ""), result.get("samples", ""),
+                             result.get("length", ""), "{:.3f}".format(result["seconds"]), result.get("error", "")] +
+                            peaks)
+
+
+def run_batch(files, workers=None, output_path="Output Files/", columns=("VibraX", "VibraY"), length_fixed=1024,
+              padding_mode="pad", window_type="rectangular", **settings):
+    """
+    Analyses the files in a pool of worker processes and writes a summary of all of them
+
+    Parameters:
+    files(List): Paths of the files, see collect_files()
+    workers(Int): Number of worker processes. By default one per core.
+    output_path(String): Folder in which the timestamped output folders are created
+    columns, length_fixed, padding_mode, window_type, settings: Passed on to pipeline.analyse_file()
+
+    Returns:
+    Tuple: (results, summary). results holds the summary returned by analyse_file() for every file, in the order
+           of files, with "seconds" added (and "error" for the files which could not be analysed).
+           summary is the path of the csv file.
+
+    Explanation:
+    Every file is independent of the others, so the throughput grows with the number of workers until the disk or
+    the memory bandwidth is the limit.
+
+    """
+    settings = dict(settings, output_path=output_path, columns=list(columns), length_fixed=length_fixed,
+                    padding_mode=padding_mode, window_type=window_type)
+    workers = workers or os.cpu_count() or 1
+    precision = settings.get("precision", "double")
+    _warm_up(length_fixed, padding_mode, window_type, precision)
+    start = time.perf_counter()
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up,
+                             initargs=(length_fixed, padding_mode, window_type, precision)) as pool:
+        futures = {pool.submit(_analyse, path, settings): path for path in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[futures[future]] = result
+            status = "failed: " + result["error"] if "error" in result else "{:.2f} s".format(result["seconds"])
+            print("[{}/{}] {} {}".format(done, len(futures), result["file"], status), flush=True)
+
+    elapsed = time.perf_counter() - start
+    results = [results[path] for path in files]
+    summary = os.path.join(output_folder(output_path), "Batch summary.csv")
+    write_summary(summary, results, columns)
+    failed = sum("error" in result for result in results)
+    print("Analysed {} files ({} failed) in {:.1f} s, {:.2f} files/s with {} workers\nSummary: {}".format(
+        len(results), failed, elapsed, len(results) / elapsed if elapsed else 0, workers, summary), flush=True)
+    return results, summary
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Analyse many vibration data files in parallel")
+    parser.add_argument("patterns", nargs="*", help="Glob patterns of the files, e.g. 'Vibration Data/*.xlsx'")
+    parser.add_argument("--manifest", help="Text file with one file to analyse per line")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, one per core by default")
+    parser.add_argument("--output-path", default="Output Files/", help="Folder for the timestamped results")
+    parser.add_argument("--cache-dir", default="", help="Folder of the parsed file cache, off by default")
+    parser.add_argument("--no-graphs", action="store_true", help="Write only the spectra, without the plots")
+    add_analysis_options(parser)
+    options = parser.parse_args(arguments)
+
+    files = collect_files(options.patterns, options.manifest)
+    if not files:
+        parser.error("No files match the patterns or the manifest")
+    run_batch(files, options.workers, options.output_path, cache_dir=options.cache_dir or None,
+              graphs=not options.no_graphs, **analysis_settings(options))
+
+
+if __name__ == "__main__":
+    main()
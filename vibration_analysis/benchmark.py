@@ -0,0 +1,316 @@
+"""
+Benchmarks of the stages of the analysis
+
+The scripts have two ways to calculate the spectra, the fft() of this package and np.fft, and nothing measured
+either of them. This module times every stage of the analysis on generated signals, so that changes can be compared:
+
+    1. transform: fourier.fft() and fourier.rfft() (also in single precision) against np.fft.fft() and np.fft.rfft().
+       fourier.fft() is the iterative transform with cached plans, the recursive fft() of the old scripts is gone.
+    2. ingest: ingest.read_samples() against pd.read_excel() / pd.read_csv(), on generated xlsx and csv files
+    3. peaks: peaks.find_peaks() and peaks.peak_pos() on the spectrum of sines in noise
+    4. output: every writer of writers.WRITERS which can run here, on the columns the analysis writes
+
+Every case (stage, implementation, size, channels) is run a few times and reported with its latency percentiles,
+its throughput in samples per second and the peak memory it allocated (measured with tracemalloc in a run of its
+own, so that tracing does not slow down the timed runs). The results are saved as JSON:
+
+    python -m vibration_analysis.benchmark --output "Benchmarks/today.json"
+    python -m vibration_analysis.benchmark --baseline "Benchmarks/today.json" --threshold 0.2
+
+With a baseline, every case whose median time grew by more than the threshold (0.2 is 20 %) is listed and the
+command exits with status 1, so it can fail a build.
+
+"""
+
+import argparse                                          # To read the options from the command line
+from datetime import datetime                            # To date the results
+import json                                              # To save and load the results
+import os                                                # To create the generated input files
+import platform                                          # To record the machine the results come from
+import sys                                               # To exit with an error on a regression
+import tempfile                                          # To keep the generated files out of the way
+import time                                              # To time the stages
+import tracemalloc                                       # To measure the peak memory of the stages
+
+import numpy as np                                       # To generate the signals
+
+from vibration_analysis.fourier import fft, rfft
+from vibration_analysis.ingest import read_samples
+from vibration_analysis.peaks import find_peaks, peak_pos
+from vibration_analysis.writers import WRITERS
+
+
+STAGES = ("transform", "ingest", "peaks", "output")
+PERCENTILES = (50, 90, 99)
+
+
+def measure(function, repeats=7, max_seconds=2.0):
+    """
+    Times function() and measures the peak memory it allocates
+
+    Parameters:
+    function(Function): Called without arguments
+    repeats(Int): Number of timed runs. Fewer are run (but at least 3) when they would take more than max_seconds.
+    max_seconds(Float): Time budget of the timed runs
+
+    Returns:
+    Dict: seconds(List) of every timed run and peak_memory(Int) in bytes, from one more run with tracemalloc
+
+    Explanation:
+    One untimed run comes first, so that plans, windows and imports are not counted.
+
+    """
+    function()
+    seconds = []
+    started = time.perf_counter()
+    while len(seconds) < repeats and (len(seconds) < 3 or time.perf_counter() - started < max_seconds):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_memory": peak_memory}
+
+
+def _record(stage, implementation, size, channels, measured):
+    # One result: the percentiles of the times, the throughput at the median time and the peak memory
+    seconds = np.asarray(measured["seconds"])
+    record = {"stage": stage, "implementation": implementation, "size": size, "channels": channels,
+              "runs": len(seconds), "mean": float(seconds.mean())}
+    for percentile in PERCENTILES:
+        record["p{}".format(percentile)] = float(np.percentile(seconds, percentile))
+    record["throughput"] = size * channels / record["p50"] if record["p50"] else float("inf")
+    record["peak_memory"] = measured["peak_memory"]
+    return record
+
+
+def _signal(size, channels, seed=0):
+    # Two sines in noise per channel, like accelerometer data
+    random = np.random.default_rng(seed)
+    t = np.arange(size)
+    sines = np.sin(2 * np.pi * 0.05 * t) + 0.5 * np.sin(2 * np.pi * 0.12 * t)
+    return sines + 0.1 * random.standard_normal((channels, size))
+
+
+def bench_transform(size, channels, repeats=7, max_seconds=2.0):
+    """
+    Times the transforms of this package against NumPy's on channels x size samples
+    """
+    x = _signal(size, channels)
+    single = x.astype(np.float32)
+    cases = {"fourier.fft": lambda: fft(x),
+             "fourier.rfft": lambda: rfft(x),
+             "fourier.rfft (single)": lambda: rfft(single, "single"),
+             "numpy.fft.fft": lambda: np.fft.fft(x, axis=-1),
+             "numpy.fft.rfft": lambda: np.fft.rfft(x, axis=-1)}
+    return [_record("transform", name, size, channels, measure(function, repeats, max_seconds))
+            for name, function in cases.items()]
+
+
+def _write_inputs(folder, size, channels):
+    # The signal as a csv file and as an xlsx file with the columns VibraX, VibraY, ... like the recordings
+    import xlsxwriter                                    # Only needed to generate the excel file
+
+    columns = ["Vibra" + "XYZ"[i] if i < 3 else "Vibra{}".format(i) for i in range(channels)]
+    values = _signal(size, channels).T
+    csv_path = os.path.join(folder, "Vibration Data {}x{}.csv".format(size, channels))
+    np.savetxt(csv_path, values, delimiter=",", header=",".join(columns), comments="", fmt="%.17g")
+    xlsx_path = os.path.join(folder, "Vibration Data {}x{}.xlsx".format(size, channels))
+    workbook = xlsxwriter.Workbook(xlsx_path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, columns)
+        for row, line in enumerate(values.tolist(), 1):
+            worksheet.write_row(row, 0, line)
+    finally:
+        workbook.close()
+    return columns, csv_path, xlsx_path
+
+
+def bench_ingest(size, channels, folder, repeats=7, max_seconds=2.0):
+    """
+    Times reading the columns of generated csv and xlsx files of size rows, with ingest.py and with pandas
+    """
+    import pandas as pd                                  # Only needed to compare with the scripts' way of reading
+
+    columns, csv_path, xlsx_path = _write_inputs(folder, size, channels)
+    cases = {"ingest.read_samples (xlsx)": lambda: read_samples(xlsx_path, columns),
+             "pandas.read_excel": lambda: pd.read_excel(xlsx_path, usecols=columns),
+             "ingest.read_samples (csv)": lambda: read_samples(csv_path, columns),
+             "pandas.read_csv": lambda: pd.read_csv(csv_path, usecols=columns)}
+    return [_record("ingest", name, size, channels, measure(function, repeats, max_seconds))
+            for name, function in cases.items()]
+
+
+def bench_peaks(size, channels, repeats=7, max_seconds=2.0):
+    """
+    Times finding the peaks of the power spectra of channels x size samples
+    """
+    spectra = np.fft.rfft(_signal(size, channels), axis=-1)
+    powers = (np.abs(spectra) / size) ** 2
+    frequencies = np.fft.rfftfreq(size)
+    cases = {"peaks.find_peaks": lambda: [find_peaks(power, frequencies, distance=3, top=10) for power in powers],
+             "peaks.peak_pos": lambda: [peak_pos(power, frequencies) for power in powers],
+             "peaks.peak_pos (quinn)": lambda: [peak_pos(power, frequencies, spectrum, peak_interpolation="quinn")
+                                                for power, spectrum in zip(powers, spectra)]}
+    return [_record("peaks", name, size, channels, measure(function, repeats, max_seconds))
+            for name, function in cases.items()]
+
+
+def bench_output(size, channels, folder, formats=None, repeats=7, max_seconds=2.0):
+    """
+    Times writing the spectra of channels x size samples in every format, see writers.WRITERS
+
+    Explanation:
+    Formats whose library is not installed are left out.
+
+    """
+    amplitudes = np.abs(np.fft.rfft(_signal(size, channels), axis=-1)) / size
+    columns = {"Frequency": np.fft.rfftfreq(size)}
+    columns.update(("Fourier_{}".format(i), amplitude) for i, amplitude in enumerate(amplitudes))
+    columns.update(("FourierPower_{}".format(i), amplitude ** 2) for i, amplitude in enumerate(amplitudes))
+    path = os.path.join(folder, "Fourier transformed Data")
+    records = []
+    for name in formats or WRITERS:
+        writer = WRITERS[name]
+        try:
+            measured = measure(lambda: writer(path, columns), repeats, max_seconds)
+        except ImportError:
+            continue
+        records.append(_record("output", "writers." + writer.__name__, size, channels, measured))
+    return records
+
+
+def run_benchmarks(sizes=tuple(2 ** k for k in range(8, 23, 2)), channels=(1, 2), stages=STAGES, repeats=7,
+                   max_seconds=2.0, max_file_size=2 ** 16, formats=None, progress=print):
+    """
+    Runs the benchmarks of the stages for every size and number of channels
+
+    Parameters:
+    sizes(List): Numbers of samples per channel
+    channels(List): Numbers of channels
+    stages(List): Some of STAGES
+    repeats(Int), max_seconds(Float): Timed runs of every case, see measure()
+    max_file_size(Int): The ingest and output stages only run up to this size, writing and parsing excel files of
+                        millions of rows takes minutes
+    formats(List): Output formats to benchmark, all of writers.WRITERS by default
+    progress(Function): Called with a line of text after every case, None to stay quiet
+
+    Returns:
+    Dict: meta(Dict) describing the machine and the settings, and results(List) with one record per case
+
+    """
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError("Unknown stages {}, use some of: {}".format(unknown, ", ".join(STAGES)))
+    meta = {"time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeats": repeats}
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            for count in channels:
+                records = []
+                if "transform" in stages:
+                    records += bench_transform(size, count, repeats, max_seconds)
+                if "ingest" in stages and size <= max_file_size:
+                    records += bench_ingest(size, count, folder, repeats, max_seconds)
+                if "peaks" in stages:
+                    records += bench_peaks(size, count, repeats, max_seconds)
+                if "output" in stages and size <= max_file_size:
+                    records += bench_output(size, count, folder, formats, repeats, max_seconds)
+                if progress is not None:
+                    for record in records:
+                        progress(format_record(record))
+                results += records
+    return {"meta": meta, "results": results}
+
+
+def format_record(record):
+    """
+    Returns one line of text describing a result of run_benchmarks()
+    """
+    return "{:<10}{:<30}{:>9} x {:<3}p50 {:>10.3f} ms  p99 {:>10.3f} ms  {:>9.2f} MS/s  {:>9.1f} MB".format(
+        record["stage"], record["implementation"], record["size"], record["channels"], record["p50"] * 1e3,
+        record["p99"] * 1e3, record["throughput"] / 1e6, record["peak_memory"] / 2 ** 20)
+
+
+def _key(record):
+    return record["stage"], record["implementation"], record["size"], record["channels"]
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Lists the cases which are slower than in the baseline
+
+    Parameters:
+    baseline(Dict): Results of run_benchmarks(), e.g. loaded from an earlier JSON file
+    current(Dict): Results of run_benchmarks()
+    threshold(Float): Allowed growth of the median time, 0.1 is 10 %
+
+    Returns:
+    List: (record, baseline_record, ratio) of every case found in both whose median time grew by more than threshold
+
+    Explanation:
+    The median is used instead of the mean, so that one run slowed down by the rest of the machine does not count
+    as a regression. Cases found in only one of the results are skipped.
+
+    """
+    previous = {_key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        old = previous.get(_key(record))
+        if old is None or not old["p50"]:
+            continue
+        ratio = record["p50"] / old["p50"]
+        if ratio > 1 + threshold:
+            regressions.append((record, old, ratio))
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the vibration analysis")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(range(8, 23, 2)),
+                        help="Sizes as powers of 2, 8 is 256 samples")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="Numbers of channels")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), help="Some of: " + ", ".join(STAGES))
+    parser.add_argument("--repeats", type=int, default=7, help="Timed runs of every case")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="Time budget of the timed runs of a case")
+    parser.add_argument("--max-file-size", type=int, default=16,
+                        help="Largest size (power of 2) of the ingest and output stages")
+    parser.add_argument("--formats", nargs="+", default=None, help="Output formats, all of them by default")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file the results are saved in")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slow down, 0.1 is 10 percent")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmarks([2 ** k for k in options.sizes], options.channels, options.stages, options.repeats,
+                             options.max_seconds, 2 ** options.max_file_size, options.formats)
+    folder = os.path.dirname(options.output)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(options.output, "w") as file:
+        json.dump(results, file, indent=1)
+    print("Results saved in '{}'".format(options.output))
+
+    if options.baseline is not None:
+        with open(options.baseline) as file:
+            regressions = compare(json.load(file), results, options.threshold)
+        for record, old, ratio in regressions:
+            print("Slower by {:.0%}: {} (was {:.3f} ms)".format(ratio - 1, format_record(record), old["p50"] * 1e3))
+        if regressions:
+            sys.exit(1)
+        print("No case is more than {:.0%} slower than '{}'".format(options.threshold, options.baseline))
+
+
+if __name__ == "__main__":
+    main()
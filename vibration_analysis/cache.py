@@ -0,0 +1,85 @@
+"""
+On disk cache of parsed vibration data files
+
+Parsing an excel workbook is by far the slowest part of a run, and the same workbook is usually analysed many times.
+The first time a file is read, its columns are converted into a binary sidecar file (see recording.py), the float64
+samples of all the columns interleaved. Every later run memory maps that file instead of parsing the workbook again,
+which takes milliseconds, and the stages which need the whole recording (Welch, spectrogram) read it from there a
+block at a time.
+
+    Cache/
+        3f2a9c0d1e7b6a55/                       # One folder per input file and sheet
+            Vibration Data.xlsx.bin             # The samples of the columns
+            Vibration Data.xlsx.bin.json        # The columns, and the sheet, size, modification time and SHA-256
+                                                # of the input file
+
+An entry is used only while the input file is unchanged. The size and modification time are checked first, if they
+differ the SHA-256 hash of the file is compared, so a file which was only copied or touched is not parsed again, see
+recording.open_recording(). Binary recordings (ingest.RAW_EXTENSIONS) can be memory mapped as they are, they are
+never copied into the cache.
+
+"""
+
+import hashlib                                           # To name the folder of every input file
+import os                                                # To find the folder of every input file
+import shutil                                            # To delete the cache
+
+from vibration_analysis.ingest import DEFAULT_COLUMNS
+from vibration_analysis.recording import open_recording
+
+
+DEFAULT_CACHE_DIR = "Cache/"
+
+
+def _entry_path(path, sheet, cache_dir):
+    key = "{}|{}".format(os.path.abspath(path), sheet)
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+
+def load_recording(path, columns=DEFAULT_COLUMNS, sheet=0, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns the whole recording of a vibration data file as a memory mapped recording.Recording
+
+    Parameters:
+    path(String): Path to an excel, csv or binary file, see ingest.iter_blocks()
+    columns(List): Names of the columns wanted
+    sheet(Int or String): Index or name of the excel sheet
+    cache_dir(String): Folder in which the parsed files are kept
+
+    Explanation:
+    An excel or csv file is parsed into the cache the first time, with every column asked for so far. A binary
+    file is opened as it is.
+
+    """
+    return open_recording(path, list(columns), _entry_path(path, sheet, cache_dir), sheet=sheet)
+
+
+def load_columns(path, columns=DEFAULT_COLUMNS, sheet=0, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns the given columns of an excel or csv file, parsing the file only if it is not cached yet
+
+    Parameters:
+    path(String): Path to an excel or csv file, see ingest.iter_blocks()
+    columns(List): Names of the columns wanted
+    sheet(Int or String): Index or name of the excel sheet
+    cache_dir(String): Folder in which the parsed files are kept
+
+    Returns:
+    Dict: The name of every column mapped to a read only, memory mapped NumPy array of all its samples
+
+    Explanation:
+    The whole file is parsed the first time, so that any later request for any number of samples can be answered
+    from the cache. Columns which are asked for later are parsed again together with the cached ones, so all the
+    columns of an entry hold the same rows.
+
+    """
+    recording = load_recording(path, columns, sheet, cache_dir)
+    return {column: recording.channel(column) for column in columns}
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Deletes every cached file in the cache folder
+    """
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,128 @@
+"""
+The analysis of 'FFT v5.py' as a function with a command line
+
+'FFT v5.py' used to do all its work at the top level: importing it read the excel file, wrote the outputs and opened
+the plots, and importing pandas and Bokeh was paid for even when only fft() or peak_pos() was wanted. The analysis
+is now run() here, called by the script with its settings, or from the command line:
+
+    python -m vibration_analysis "Vibration Data/Vibration Data - Modified.xlsx" --window hann
+
+run() is a thin wrapper of pipeline.analyse_file(), which the watch and batch services call as well. Nothing happens
+when this module is imported. Bokeh (and the writers' libraries) are only imported by run(), when the outputs are
+written and the plots are drawn.
+
+"""
+
+import argparse                                          # To read the options from the command line
+
+from vibration_analysis.fourier import PADDING_MODES
+from vibration_analysis.ingest import DEFAULT_COLUMNS
+from vibration_analysis.instrument import INSTRUMENT_MODES
+from vibration_analysis.peaks import INTERPOLATIONS
+from vibration_analysis.pipeline import analyse_file, column_label, POWER_MODES
+from vibration_analysis.plan import PRECISIONS
+from vibration_analysis.preprocess import parse_detrend
+from vibration_analysis.windows import WINDOWS
+from vibration_analysis.writers import WRITERS
+
+
+Y_RANGES = {"X": (-0.005, 1), "Y": (-0.005, 3)}          # Fixed y axis of the plots of every column, as in the script
+
+
+def run(vibration_input_file, output_path="Output Files/", cache_path="Cache/", columns=DEFAULT_COLUMNS,
+        length_fixed=1024, padding_mode="pad", window_type="rectangular", peak_count=10, peak_distance=3,
+        peak_interpolation=None, power_mode="periodogram", plot_spectrogram=False, spectrogram_hop=256,
+        zoom_band=None, zoom_bins=1000, fs=1, y_ranges=None, output_formats=("excel",), plot_levels=0,
+        headless=False, instrument_mode=None, detrend="constant", precision="double"):
+    """
+    Runs the analysis of 'FFT v5.py' on one file: writes the excel sheet, opens the report and prints the peaks
+
+    Parameters:
+    vibration_input_file(String): The excel or csv file to analyse
+    output_path(String): Folder in which the timestamped Excel and Graph folders are created
+    cache_path(String): Folder of the parsed file cache (see cache.py), None to always parse the file
+    columns(List): Names of the columns to analyse
+    The other settings are explained in 'FFT v5.py' and pipeline.analyse_file(), which does the analysis. y_ranges
+    maps the label of a column ("X", "Y") to the fixed (min, max) of its y axis, by default Y_RANGES. output_formats
+    are the formats the spectra are written in, see writers.WRITERS.
+
+    Returns:
+    Dict: See pipeline.analyse_file(), with the frequencies(Array), amplitudes(Array) and powers(Array) of every
+          column
+
+    """
+    result = analyse_file(vibration_input_file, output_path, columns, length_fixed, padding_mode, window_type, fs,
+                          peak_count, peak_distance, peak_interpolation, cache_dir=cache_path,
+                          formats=output_formats, instrument_mode=instrument_mode, detrend=detrend,
+                          precision=precision, power_mode=power_mode, plot_spectrogram=plot_spectrogram,
+                          spectrogram_hop=spectrogram_hop, zoom_band=zoom_band, zoom_bins=zoom_bins,
+                          y_ranges=Y_RANGES if y_ranges is None else y_ranges, plot_levels=plot_levels,
+                          headless=headless, return_spectra=True)
+
+    # Print the positions of the peaks
+    for column in columns:
+        print("Peaks in {} axis \n (Frq, Amp)\n".format(column_label(column)), result["peaks"][column])
+    return result
+
+
+def add_analysis_options(parser):
+    """
+    Adds the settings of the analysis to the options of a command line, see analysis_settings()
+
+    Explanation:
+    The command lines of cli.py, watch.py and batch.py share these, so every entry point has the same settings.
+    Every setting is checked by the parser, so a mistyped one stops the command before any file is read.
+
+    """
+    parser.add_argument("--columns", nargs="+", default=list(DEFAULT_COLUMNS), help="Columns to analyse")
+    parser.add_argument("--length", type=int, default=1024, help="Number of samples analysed, length_fixed")
+    parser.add_argument("--padding", default="pad", choices=list(PADDING_MODES), help="How the signal is zero padded")
+    parser.add_argument("--detrend", type=parse_detrend, default="constant",
+                        help="Trend removed from the samples: none, constant, linear or a polynomial degree")
+    parser.add_argument("--precision", default="double", choices=list(PRECISIONS),
+                        help="double, or single for float32 samples and spectra")
+    parser.add_argument("--window", default="rectangular", choices=list(WINDOWS), help="Window applied before the FFT")
+    parser.add_argument("--power", default="periodogram", choices=list(POWER_MODES),
+                        help="The power spectrum of the first samples, or Welch's average of the whole recording")
+    parser.add_argument("--peaks", type=int, default=10, help="Number of peaks found")
+    parser.add_argument("--interpolation", default=None, choices=list(INTERPOLATIONS),
+                        help="Estimate the peaks between the bins")
+    parser.add_argument("--spectrogram", action="store_true", help="Also plot the spectrogram of the recording")
+    parser.add_argument("--zoom", type=float, nargs=2, default=None, help="Also plot the band from LOW to HIGH Hz")
+    parser.add_argument("--fs", type=float, default=1, help="Sampling frequency in Hz")
+    parser.add_argument("--instrument", default=None, choices=[mode for mode in INSTRUMENT_MODES if mode],
+                        help="Record the stages of a run")
+    parser.add_argument("--plot-levels", type=int, default=0, help="Finer levels of detail saved with the plots")
+    parser.add_argument("--formats", nargs="+", default=["excel"], choices=list(WRITERS), help="Output formats")
+
+
+def analysis_settings(options):
+    """
+    Returns the options added by add_analysis_options() as keyword arguments of pipeline.analyse_file()
+    """
+    return {"columns": options.columns, "length_fixed": options.length, "padding_mode": options.padding,
+            "detrend": options.detrend, "precision": options.precision, "window_type": options.window,
+            "power_mode": options.power, "peak_count": options.peaks, "peak_interpolation": options.interpolation,
+            "plot_spectrogram": options.spectrogram, "zoom_band": options.zoom, "fs": options.fs,
+            "instrument_mode": options.instrument, "plot_levels": options.plot_levels, "formats": options.formats}
+
+
+def main(arguments=None):
+    """
+    Reads the settings from the command line and runs the analysis, see run()
+    """
+    parser = argparse.ArgumentParser(description="Fourier Transform of the vibration data in an excel or csv file")
+    parser.add_argument("vibration_input_file", help="The excel or csv file to analyse")
+    parser.add_argument("--output-path", default="Output Files/", help="Folder for the timestamped results")
+    parser.add_argument("--cache-dir", default="Cache/", help="Folder of the parsed file cache, '' to turn it off")
+    parser.add_argument("--headless", action="store_true", help="Save the report without opening the browser")
+    add_analysis_options(parser)
+    options = parser.parse_args(arguments)
+
+    settings = analysis_settings(options)
+    run(options.vibration_input_file, options.output_path, options.cache_dir or None,
+        output_formats=settings.pop("formats"), headless=options.headless, **settings)
+
+
+if __name__ == "__main__":
+    main()
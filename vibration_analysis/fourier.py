@@ -0,0 +1,460 @@
+"""
+Fast Fourier Transform engine
+
+The transform used to be a recursive function which split the signal with x[0::2] and x[1::2] and built three new
+lists at every level of the recursion. The same Cooley-Tukey butterflies are now done iteratively:
+
+    1. The samples are copied once into a complex array in bit reversed order
+    2. log2(n) passes of butterflies are run over that array, in place
+
+The twiddle factors exp(-2j * pi * p / length) are calculated exactly like the recursive version did, so the
+magnitudes are bit identical to the old fft(), but the memory used is O(n) and nothing is allocated per sample.
+The bit reversed order and the twiddle factors only depend on the length, so they are taken from a cached plan
+(see plan.py) and the transform itself only pays for the butterflies.
+
+Lengths which are not a power of 2 do not have to be zero padded any more:
+
+    1. Lengths made of the factors 2, 3 and 5 (1000, 4320, ...) are split level by level into those radices
+    2. Any other length (e.g. a prime number) is calculated as a convolution with Bluestein's algorithm
+
+choose_length() decides how much a signal should be padded, see PADDING_MODES.
+
+For real signals (the accelerometer data), rfft() packs the samples into a complex signal of half the length and
+returns only the one sided spectrum.
+
+Both fft() and rfft() accept a 2-D array of channels x samples. All the channels (VibraX, VibraY, ...) are then
+transformed together in every pass, with one plan, instead of one python call per channel.
+
+Both also take a precision. "single" keeps the samples in float32 and the spectra in complex64 from start to end,
+with complex64 plans, so they use half the memory and memory bandwidth of "double". The rounding error of a
+transform grows slowly with n: the largest error of a bin, relative to the largest bin, measured against np.fft on
+noise and on sines in noise is
+
+    n               2^10      2^14      2^18      2^22
+    single          1.3e-7    1.7e-7    1.7e-7    2.3e-7
+    double          4.4e-16   7.7e-16   8.1e-16   1.1e-15
+
+Lengths which are not a power of 2 stay below 3e-7 in single precision. That is about the quantisation step of a
+24 bit ADC (2^-23 = 1.2e-7 of the full scale) and 100 times below that of a 16 bit ADC (3e-5), so the peaks found
+are the same. Only the floor of the spectrum, about -130 dB below its largest bin, is higher than with "double".
+
+NumPy is used when it is installed, otherwise the butterflies are done on a python list, always in double precision.
+
+"""
+
+from math import log2, ceil                              # To estimate the cost of a transform and to find powers of 2
+
+try:
+    import numpy as np                                   # To run the butterflies on whole arrays at once
+except ImportError:                                      # Fall back to plain python lists
+    np = None
+
+from vibration_analysis.plan import get_plan, is_power_2, factorise, FFTPlan, MixedRadixPlan, PRECISIONS
+
+
+PADDING_MODES = {
+    "pad": "Zero pad up to the next power of 2, as the scripts always did",
+    "native": "No padding, transform the signal at its own length",
+    "fast": "Zero pad up to the next length made only of the factors 2, 3 and 5",
+    "auto": "Pick the cheapest of the three lengths above using transform_cost()",
+}
+
+_RADIX_COST = {2: 1.0, 3: 1.0, 5: 1.2}                   # Measured cost per sample of one level, relative to radix 2
+_BATCH_BYTES = 2**20                                     # Size of the group of channels transformed in one pass
+
+
+def _complex_type(precision):
+    # The NumPy type of the spectra of a precision, see PRECISIONS
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '{}', use one of: {}".format(precision, ", ".join(PRECISIONS)))
+    return np.dtype(PRECISIONS[precision][1])
+
+
+def _is_batch(x):
+    # True for a list of channels (a list of lists) when running without NumPy
+    return len(x) > 0 and isinstance(x[0], (list, tuple))
+
+
+def _multiply(a, b, out):
+    # Complex product written out the way python does it. NumPy's own complex multiply may use fused
+    # multiply-add instructions, which changes the last bit of the result compared to the python version.
+    out.real = a.real * b.real - a.imag * b.imag
+    out.imag = a.real * b.imag + a.imag * b.real
+    return out
+
+
+def _butterflies_numpy(data, passes):
+    # Runs the passes of butterflies in place along the last axis of data, which is already in bit reversed order.
+    # Any leading axes (channels) are transformed in the same pass, sharing the twiddle factors.
+    n = data.shape[-1]
+    channels = data.shape[:-1]
+    length = 2
+    for twiddles in passes:
+        half = length // 2
+        blocks = data.reshape(channels + (n // length, length))    # One butterfly group per row, no copy is made
+        fourier = _multiply(twiddles, blocks[..., half:], np.empty(channels + (n // length, half), dtype=data.dtype))
+        blocks[..., half:] = blocks[..., :half] - fourier
+        blocks[..., :half] += fourier
+        length *= 2
+    return data
+
+
+def _butterflies_python(data, passes):
+    n = len(data)
+    length = 2
+    for twiddles in passes:
+        half = length // 2
+        for start in range(0, n, length):
+            for p in range(half):
+                even = data[start + p]
+                fourier = twiddles[p] * data[start + p + half]
+                data[start + p] = even + fourier
+                data[start + p + half] = even - fourier
+        length *= 2
+    return data
+
+
+def _mixed_radix_numpy(data, plan, level=0):
+    # Transforms data along its last axis. At every level the signal is split into `radix` interleaved
+    # sub signals (x[j::radix]), those are transformed by the next level, multiplied by the twiddle factors and
+    # combined with a small radix x radix DFT, which gives the bins in the order k2 * (length / radix) + k1.
+    if level == len(plan.factors):
+        return data
+    radix = plan.factors[level]
+    length = data.shape[-1]
+    interleaved = data.reshape(data.shape[:-1] + (length // radix, radix))
+    sub_signals = np.swapaxes(interleaved, -1, -2)       # Row j holds x[j::radix]
+    transformed = _mixed_radix_numpy(sub_signals, plan, level + 1) * plan.twiddles[level]
+    return np.matmul(plan.dft_matrices[radix], transformed).reshape(data.shape)
+
+
+def _bluestein_numpy(data, plan):
+    inner = get_plan(plan.inner_length, plan.precision)
+    padded = np.zeros(data.shape[:-1] + (plan.inner_length,), dtype=data.dtype)
+    padded[..., :plan.length] = data * plan.chirp
+    spectrum = _butterflies_numpy(padded[..., inner.bit_reverse], inner.twiddles)
+    spectrum *= plan.filter
+    # The inverse transform is done with the forward one, ifft(y) = conj(fft(conj(y))) / n
+    convolution = _butterflies_numpy(np.conj(spectrum)[..., inner.bit_reverse], inner.twiddles)
+    return np.conj(convolution[..., :plan.length]) * plan.chirp / plan.inner_length
+
+
+def _bluestein_python(data, plan):
+    inner = get_plan(plan.inner_length)
+    padded = [0j] * plan.inner_length
+    for k in range(plan.length):
+        padded[k] = data[k] * plan.chirp[k]
+    spectrum = _butterflies_python([padded[i] for i in inner.bit_reverse], inner.twiddles)
+    spectrum = [(value * weight).conjugate() for value, weight in zip(spectrum, plan.filter)]
+    convolution = _butterflies_python([spectrum[i] for i in inner.bit_reverse], inner.twiddles)
+    return [convolution[k].conjugate() * plan.chirp[k] / plan.inner_length for k in range(plan.length)]
+
+
+def _fft_numpy(data):
+    plan = get_plan(data.shape[-1], "single" if data.dtype == np.complex64 else "double")
+    if isinstance(plan, FFTPlan):
+        # Reading in bit reversed order makes the only copy, the butterflies work on it in place
+        return _butterflies_numpy(data[..., plan.bit_reverse], plan.twiddles)
+    if isinstance(plan, MixedRadixPlan):
+        return _mixed_radix_numpy(data, plan)
+    return _bluestein_numpy(data, plan)
+
+
+def _in_chunks(transform, data, bins, dtype):
+    # Runs the transform over groups of channels which are small enough to stay in the CPU cache.
+    # One big pass over all the channels is slower than a few smaller ones once the data no longer fits.
+    if data.ndim == 1:
+        return transform(data)
+    channels = data.reshape(-1, data.shape[-1])
+    step = max(1, _BATCH_BYTES // (16 * data.shape[-1]))   # The same groups in single precision, measured faster
+    if step >= len(channels):
+        return transform(data)
+    spectra = np.empty((len(channels), bins), dtype=dtype)
+    for start in range(0, len(channels), step):
+        spectra[start:start + step] = transform(channels[start:start + step])
+    return spectra.reshape(data.shape[:-1] + (bins,))
+
+
+def fft(x, precision="double"):
+    """
+    Calculates and returns the Discrete Fourier Transform using Cooley-Tukey's algorithm
+
+    Parameter:
+    x(Array): An array of any length n. Powers of 2 are the fastest, followed by lengths made of 2, 3 and 5.
+              A 2-D array (channels x samples) transforms every channel with the same plan in one pass.
+    precision(String): "double" (complex128) or "single" (complex64), see PRECISIONS
+
+    Returns:
+    Array: An array of complex numbers having length n after calculating the Fourier Transform
+           (channels x n for a 2-D input). It is a NumPy array when NumPy is installed, otherwise a python list.
+
+    Explanation:
+    The input is not modified. For a power of 2, it is copied once into bit reversed order and then combined in
+    log2(n) passes, where every pass merges pairs of transforms of length/2 into transforms of the given length.
+    Other lengths use the mixed radix or Bluestein plans, see plan.py.
+
+    Example:
+    fft([1, 0, 0, 0]) returns [1, 1, 1, 1]
+
+    """
+    if np is None:
+        if _is_batch(x):
+            return [fft(channel) for channel in x]
+        length = len(x)
+        if length <= 1:
+            return list(x)
+        plan = get_plan(length)
+        if isinstance(plan, FFTPlan):
+            return _butterflies_python([complex(x[i]) for i in plan.bit_reverse], plan.twiddles)
+        return _bluestein_python(x, plan)
+
+    dtype = _complex_type(precision)
+    data = np.asarray(x, dtype=dtype)
+    length = data.shape[-1]
+    if length <= 1:
+        return data.copy()
+    return _in_chunks(_fft_numpy, data, length, dtype)
+
+
+def _untangle_numpy(data, twiddles):
+    # Turns the transform Z of the packed signal into the first half of the transform of the real signal
+    half = data.shape[-1]
+    spectrum = np.empty(data.shape[:-1] + (half + 1,), dtype=data.dtype)
+    spectrum[..., :half] = data
+    spectrum[..., half] = data[..., 0]                   # Z[n/2] is Z[0], the half length transform is periodic
+    mirrored = np.conj(spectrum[..., ::-1])              # conj(Z[n/2 - k]) for every k
+    even = (spectrum + mirrored) * 0.5
+    odd = (spectrum - mirrored) * -0.5j
+    return even + twiddles * odd
+
+
+def _rfft_numpy(x):
+    length = x.shape[-1]
+    half = length // 2
+    single = x.dtype == np.float32
+    packed = x.view(np.complex64 if single else complex) # z[k] = x[2k] + 1j * x[2k + 1], no copy
+    if is_power_2(length):
+        plan = get_plan(length, "single" if single else "double")
+        # The bit reversed order for n/2 samples is every second entry of the order for n samples
+        data = _butterflies_numpy(packed[..., plan.bit_reverse[::2]], plan.twiddles[:-1])
+        twiddles = np.empty(half + 1, dtype=packed.dtype)
+        twiddles[:half] = plan.twiddles[-1]
+        twiddles[half] = -1                              # exp(-1j * pi)
+    else:
+        data = fft(packed, "single" if single else "double")
+        twiddles = np.exp(-2j * np.pi * np.arange(half + 1) / length).astype(packed.dtype)
+    return _untangle_numpy(data, twiddles)
+
+
+def _rfft_python(x, plan):
+    half = plan.length // 2
+    packed = [complex(x[2 * i], x[2 * i + 1]) for i in plan.bit_reverse[::2]]
+    data = _butterflies_python(packed, plan.twiddles[:-1])
+    data.append(data[0])
+
+    twiddles = list(plan.twiddles[-1]) + [-1]
+    spectrum = []
+    for k in range(half + 1):
+        mirrored = data[half - k].conjugate()
+        even = (data[k] + mirrored) * 0.5
+        odd = (data[k] - mirrored) * -0.5j
+        spectrum.append(even + twiddles[k] * odd)
+    return spectrum
+
+
+def rfft(x, precision="double"):
+    """
+    Calculates the Discrete Fourier Transform of a real signal, returning only the one sided spectrum
+
+    Parameter:
+    x(Array): An array of real numbers of any length n, or a 2-D array (channels x samples) of them
+    precision(String): "double" (float64 in, complex128 out) or "single" (float32 in, complex64 out)
+
+    Returns:
+    Array: An array of n//2 + 1 complex numbers, the bins from 0 Hz up to Fs/2 (channels x bins for a 2-D input).
+           It is a NumPy array when NumPy is installed, otherwise a python list.
+
+    Explanation:
+    The transform of a real signal is symmetrical (X[n-k] is the complex conjugate of X[k]), so the upper half
+    carries no information. Instead of calculating it and throwing it away:
+
+        1. The n real samples are packed into n/2 complex numbers, z[k] = x[2k] + 1j * x[2k+1]
+        2. One complex transform of length n/2 is calculated, Z = fft(z)
+        3. The transforms of the even and odd samples are separated again using the symmetry,
+            E[k] = (Z[k] + conj(Z[n/2-k])) / 2 and O[k] = -1j * (Z[k] - conj(Z[n/2-k])) / 2
+        4. They are combined with one last pass of twiddles, X[k] = E[k] + exp(-2j * pi * k / n) * O[k]
+
+    This needs half the butterflies and half the memory of fft(x). For a power of 2 the plan of length n is used
+    for both steps. Odd lengths can not be packed, their full transform is calculated and cut in half.
+
+    Example:
+    rfft([1, 2, 3, 4]) returns [10, -2+2j, -2]
+
+    """
+    if np is None:
+        if _is_batch(x):
+            return [rfft(channel) for channel in x]
+        length = len(x)
+        if length <= 1:
+            return [complex(v) for v in x]
+        if length % 2 == 1 or not is_power_2(length):
+            return fft(x)[:length // 2 + 1]
+        return _rfft_python(x, get_plan(length))
+
+    dtype = _complex_type(precision)
+    data = np.ascontiguousarray(x, dtype=PRECISIONS[precision][0])
+    length = data.shape[-1]
+    if length <= 1:
+        return data.astype(dtype)
+    if length % 2 == 1:
+        return fft(data, precision)[..., :length // 2 + 1]
+    return _in_chunks(_rfft_numpy, data, length // 2 + 1, dtype)
+
+
+def next_fast_length(n):
+    """
+    Returns the smallest length, not smaller than n, made only of the factors 2, 3 and 5
+
+    Parameter:
+    n(Int): A positive integer
+
+    Returns:
+    Int: The next length which can be transformed with the mixed radix plan
+
+    Example:
+    next_fast_length(4097) returns 4320 (2^5 * 3^3 * 5), while the next power of 2 is 8192
+
+    """
+    best = 1 << (n - 1).bit_length()                     # The next power of 2 always qualifies
+    power_5 = 1
+    while power_5 < best:
+        power_35 = power_5
+        while power_35 < best:
+            length = power_35
+            while length < n:                            # Fill up the rest with factors of 2
+                length *= 2
+            best = min(best, length)
+            power_35 *= 3
+        power_5 *= 5
+    return best
+
+
+def transform_cost(n):
+    """
+    Estimates the relative cost of a transform of length n
+
+    Parameter:
+    n(Int): Length of the transform
+
+    Returns:
+    Float: A number proportional to the expected run time. Only useful to compare lengths with each other.
+
+    Explanation:
+    Every level of a mixed radix transform touches all n samples, at a cost which grows with the radix.
+    A power of 2 costs n * log2(n). Bluestein's algorithm costs two transforms of the inner power of 2 length
+    plus the chirp multiplications.
+
+    """
+    if n <= 1:
+        return 0.0
+    if is_power_2(n):
+        return n * log2(n)
+    factors = factorise(n) if np is not None else None
+    if factors is not None:
+        return n * sum(_RADIX_COST[radix] for radix in factors)
+    inner_length = 1 << (2 * n - 2).bit_length()
+    return 2 * transform_cost(inner_length) + 4 * inner_length
+
+
+def choose_length(n, mode="pad"):
+    """
+    Returns the length a signal of n samples should be zero padded to before the transform
+
+    Parameters:
+    n(Int): Number of samples in the signal
+    mode(String): One of PADDING_MODES - "pad", "native", "fast" or "auto"
+
+    Returns:
+    Int: Length of the transform, never smaller than n
+
+    Example:
+    choose_length(4097, "pad") returns 8192
+    choose_length(4097, "native") returns 4097
+    choose_length(4097, "fast") returns 4320
+    choose_length(4097, "auto") returns 4320, as a prime factor like 4097 = 17 * 241 needs Bluestein's algorithm
+
+    """
+    if mode not in PADDING_MODES:
+        raise ValueError("Unknown padding mode '{}', use one of: {}".format(mode, ", ".join(PADDING_MODES)))
+    if n <= 1 or mode == "native":
+        return n
+    if mode == "pad":
+        return 1 << (n - 1).bit_length()
+    if mode == "fast":
+        return next_fast_length(n)
+    candidates = sorted({n, next_fast_length(n), 1 << (n - 1).bit_length()})
+    return min(candidates, key=transform_cost)           # Ties go to the shortest length, min() keeps the first
+
+
+def nxt_power_2(x):
+    """
+    Returns the next higher power of 2 closest to the given number
+
+    parameter:
+    x(Int): An integer whose next higher power of 2 we want to find
+
+    Returns:
+    Int: An integer which is a power of 2 that is closest and larger than x
+
+    Explanation:
+    Consider nxt_power_2(100).
+
+    log2(x) gives the log value of x, log2(100) returns 6.643856189774724
+    ceil(x) gives the smallest integer greater than x, ceil(6.643856189774724) returns 7
+    Now, 2^7 returns 128, thus 128 is the next power of 2 closest to 100.
+
+
+    examples:
+    if x = 10, nxt_power_2(x) returns 16.
+    if x = 1000, nxt_power_2(x) returns 1024.
+    if x = 64, nxt_power_2(x) returns 64.
+
+    """
+    return 2**ceil(log2(x))
+
+
+def zero_pad(arr, length=None):
+    """
+    Adds a series of 0s to the end of signal such that signal length becomes a power of 2
+
+    Parameters:
+    arr(Array): An array of any length
+    length(Int): Length to pad up to, see choose_length(). By default the next power of 2.
+
+    Returns:
+    Array: An array of length 2^x (or the given length)
+
+    Explanation:
+    The next closest power of 2 is found for the length of the input array.
+
+    If the length of the array is same as the next power, then the array doesn't need to be altered.
+
+    If the length is not a power of 2, then the difference is found,
+     and that many zeros are added to the end of the array.
+
+    Then the array with a length of a power of 2 (either with zeros appended or not) is returned.
+
+    example:
+    if array = [1, 2, 3, 4, 5] which of length 5(not a power of 2),
+        the function returns [1, 2, 3, 4, 5, 0, 0, 0] which is of length 8(power of2)
+
+    if array = [2, 5, 9, 7] which is of length 4(already a power of 2),
+        the function returns the same [2, 5, 9, 7]
+
+    """
+    nextpwr = nxt_power_2(len(arr)) if length is None else length
+    length_of_array = len(arr)
+    if nextpwr != length_of_array:
+        for j in range(nextpwr-length_of_array):
+            arr.append(0)
+    return arr
@@ -0,0 +1,201 @@
+"""
+Streaming reader for vibration data files
+
+pd.read_excel() loads the whole workbook into a DataFrame before the scripts take the first few thousand rows of it,
+so the start up time and the memory used grow with the size of the file, not with the number of samples analysed.
+
+The functions here read the file a block of rows at a time and stop as soon as enough samples have been read:
+
+    1. .xlsx / .xlsm: openpyxl in read only mode, rows are parsed one by one from the zipped XML
+    2. .xls: xlrd with on demand loading, the columns of a block are read directly from the sheet
+    3. .csv / .txt: pandas.read_csv in chunks, with only the needed columns parsed
+    4. .bin / .raw / .dat: interleaved binary samples, memory mapped, with their layout in "<file>.json" (see
+       recording.py)
+
+read_samples() can keep the parsed columns in a binary cache on disk, see cache.py.
+
+The first row of the sheet holds the column names, like pd.read_excel() expects. Every block is a NumPy array of
+channels x samples, the layout fft() and rfft() take for a batch of channels.
+
+    for block in iter_blocks("Vibration Data.xlsx", ["VibraX", "VibraY"], block_size=4096):
+        ...
+    vibra_x, vibra_y = read_samples("Vibration Data.xlsx", ["VibraX", "VibraY"], max_samples=1024)
+
+"""
+
+import os                                                # To find the type of the file from its extension
+
+import numpy as np                                       # The blocks are returned as NumPy arrays
+
+
+DEFAULT_COLUMNS = ("VibraX", "VibraY")                   # Names of the accelerometer columns in the input files
+DEFAULT_BLOCK_SIZE = 65536                               # Number of rows read at a time
+RAW_EXTENSIONS = (".bin", ".raw", ".dat")                # Binary recordings, see recording.py
+
+
+def _column_indices(header, columns, path):
+    names = [str(name).strip() if name is not None else "" for name in header]
+    indices = []
+    for column in columns:
+        if column not in names:
+            raise ValueError("Column '{}' not found in '{}', the columns are: {}".format(column, path, names))
+        indices.append(names.index(column))
+    return indices
+
+
+def _xlsx_rows(path, sheet):
+    import openpyxl                                      # Only needed for .xlsx files
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+        for row in worksheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def _xls_rows(path, sheet):
+    import xlrd                                          # Only needed for .xls files
+
+    workbook = xlrd.open_workbook(path, on_demand=True)
+    try:
+        worksheet = workbook.sheet_by_index(sheet) if isinstance(sheet, int) else workbook.sheet_by_name(sheet)
+        for index in range(worksheet.nrows):
+            yield [None if value == "" else value for value in worksheet.row_values(index)]
+    finally:
+        workbook.release_resources()
+
+
+def _row_blocks(rows, columns, block_size, path):
+    # Collects the wanted cells of the rows into blocks of channels x block_size samples
+    header = next(rows, None)
+    if header is None:
+        return
+    indices = _column_indices(header, columns, path)
+    block = np.empty((len(columns), block_size))
+    filled = 0
+    blank = 0                                            # Rows blank in every cell, not added yet
+    for row in rows:
+        # Like pd.read_excel(), rows are only dropped when they are blank in every cell and no row with a value
+        # follows them. Whether a row is blank does not depend on the columns read, so every column keeps the same rows.
+        if all(value is None for value in row):
+            blank += 1
+            continue
+        values = [row[index] if index < len(row) else None for index in indices]
+        for cells in [[None] * len(indices)] * blank + [values]:
+            block[:, filled] = [np.nan if value is None else value for value in cells]
+            filled += 1
+            if filled == block_size:
+                yield block
+                block = np.empty((len(columns), block_size))
+                filled = 0
+        blank = 0
+    if filled:
+        yield block[:, :filled]
+
+
+def _csv_blocks(path, columns, block_size, max_samples):
+    import pandas as pd                                  # Its C parser is much faster than the csv module
+
+    chunks = pd.read_csv(path, usecols=list(columns), chunksize=block_size, nrows=max_samples)
+    try:
+        for chunk in chunks:
+            yield np.ascontiguousarray(chunk[list(columns)].to_numpy(dtype=float).T)
+    finally:
+        chunks.close()
+
+
+def iter_blocks(path, columns=DEFAULT_COLUMNS, block_size=DEFAULT_BLOCK_SIZE, max_samples=None, sheet=0):
+    """
+    Reads the given columns of a vibration data file lazily, one block of rows at a time
+
+    Parameters:
+    path(String): Path to an excel (.xlsx, .xlsm, .xls), csv (.csv, .txt) or binary (.bin, .raw, .dat) file
+    columns(List): Names of the columns to read, from the first row of the sheet
+    block_size(Int): Number of samples in every block
+    max_samples(Int): Stop reading once this many samples were read. None reads the whole file.
+    sheet(Int or String): Index or name of the excel sheet to read
+
+    Returns:
+    Generator: NumPy arrays of shape (len(columns), samples). Every block has block_size samples, except the last one.
+               Empty cells are returned as NaN.
+
+    Explanation:
+    The file is closed as soon as max_samples are read or the generator is closed, the rest of the file is never
+    parsed. Only one block is held in memory at a time.
+
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1, got {}".format(block_size))
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".csv", ".txt"):
+        blocks = _csv_blocks(path, columns, block_size, max_samples)
+    elif extension in (".xlsx", ".xlsm"):
+        blocks = _row_blocks(_xlsx_rows(path, sheet), columns, block_size, path)
+    elif extension == ".xls":
+        blocks = _row_blocks(_xls_rows(path, sheet), columns, block_size, path)
+    elif extension in RAW_EXTENSIONS:
+        from vibration_analysis.recording import load_description   # recording.py converts files with this module
+
+        blocks = load_description(path).iter_blocks(columns, block_size, max_samples)
+    else:
+        raise ValueError("Can not read '{}', the supported files are .xlsx, .xlsm, .xls, .csv, .txt, .bin, .raw and "
+                         ".dat".format(path))
+
+    remaining = max_samples
+    try:
+        for block in blocks:
+            if remaining is not None and block.shape[1] >= remaining:
+                yield block[:, :remaining]
+                return
+            if remaining is not None:
+                remaining -= block.shape[1]
+            yield block
+    finally:
+        blocks.close()                                   # Closes the workbook or csv file without reading the rest
+
+
+def read_samples(path, columns=DEFAULT_COLUMNS, max_samples=None, block_size=DEFAULT_BLOCK_SIZE, sheet=0,
+                 cache_dir=None, dtype=np.float64):
+    """
+    Reads the given columns of a vibration data file into one array, stopping after max_samples
+
+    Parameters:
+    path(String): Path to an excel (.xlsx, .xlsm, .xls), csv (.csv, .txt) or binary (.bin, .raw, .dat) file
+    columns(List): Names of the columns to read
+    max_samples(Int): Number of samples wanted. None reads the whole file.
+    block_size(Int): Number of rows read at a time
+    sheet(Int or String): Index or name of the excel sheet to read
+    cache_dir(String): Folder of the binary cache, see cache.py. The first read parses the whole file into the
+                       cache and every later read of the same, unchanged file is served from it. None reads the file.
+                       Binary files are memory mapped as they are, they are never cached.
+    dtype(Type): Type of the samples returned, np.float32 halves the memory (see fourier.py for its precision)
+
+    Returns:
+    Array: A NumPy array of shape (len(columns), samples), one row per column. It has fewer than max_samples
+           samples if the file is shorter.
+
+    Example:
+    vibra_x, vibra_y = read_samples("Vibration Data.xlsx", ["VibraX", "VibraY"], max_samples=1024)
+
+    """
+    if cache_dir is not None and os.path.splitext(path)[1].lower() not in RAW_EXTENSIONS:
+        from vibration_analysis.cache import load_columns     # cache.py itself reads the files with this module
+
+        cached = load_columns(path, columns, sheet, cache_dir)
+        return np.array([cached[column][:max_samples] for column in columns], dtype=dtype)
+
+    if max_samples is not None:
+        # The size is known, so the blocks are copied straight into their place in the result
+        samples = np.empty((len(columns), max_samples), dtype=dtype)
+        filled = 0
+        for block in iter_blocks(path, columns, min(block_size, max(max_samples, 1)), max_samples, sheet):
+            samples[:, filled:filled + block.shape[1]] = block
+            filled += block.shape[1]
+        return samples[:, :filled]
+
+    blocks = list(iter_blocks(path, columns, block_size, None, sheet))
+    if not blocks:
+        return np.empty((len(columns), 0), dtype=dtype)
+    return np.concatenate(blocks, axis=1).astype(dtype, copy=False)
@@ -0,0 +1,183 @@
+"""
+Time and memory taken by every stage of an analysis
+
+When an analysis is slow, the time can go to reading the excel file, the FFT, writing the outputs or drawing the
+plots. The stages of pipeline.analyse_file() (which cli.run() calls) are timed with a RunRecorder:
+
+    recorder = RunRecorder("memory")
+    with recorder.stage("read"):
+        samples = read_samples(...)
+    recorder.save(folder)                                # Writes <folder>/Run record.json
+
+What is measured depends on the mode, see INSTRUMENT_MODES. The run record lists every stage with its start, its
+duration and, in "memory" mode, the peak memory allocated during it (measured with tracemalloc). In "profile" mode
+the whole run is profiled with cProfile as well, and the profile is saved next to the record, to be read with
+pstats or snakeviz.
+
+With the mode None nothing is measured: stage() returns the same empty context manager every time and save()
+writes nothing, so the instrumentation costs nothing when it is off.
+
+tracemalloc measures the whole process. Recorders in several threads at once (the watch service with more than one
+worker) share it: it runs while any of them is measuring memory, and the peak of a stage includes the memory the
+other threads allocated while it ran, so the peaks of stages which overlap in time overlap as well.
+
+"""
+
+from contextlib import contextmanager, nullcontext       # To time the stages with a with statement
+from datetime import datetime                            # To date the run record
+import json                                              # To write the run record
+import os                                                # To save the record next to the outputs
+import platform                                          # To record the python the run used
+import threading                                         # To share tracemalloc between the recorders of threads
+import time                                              # To time the stages
+import tracemalloc                                       # To measure the memory allocated by the stages
+
+
+INSTRUMENT_MODES = {
+    None: "Nothing is measured",
+    "time": "Duration of every stage",
+    "memory": "Duration and peak memory of every stage, with tracemalloc, which slows down python code",
+    "profile": "Duration of every stage and a cProfile profile of the whole run, saved as 'Run profile.prof'",
+}
+
+_OFF = nullcontext()                                     # Returned by stage() when nothing is measured
+
+_TRACING_LOCK = threading.Lock()
+_tracing = {"recorders": 0,                              # Recorders measuring memory at the moment
+            "stages": 0,                                 # Stages measuring memory at the moment
+            "started": False}                            # True if tracemalloc was started by a recorder
+
+
+def _start_tracing():
+    # Starts tracemalloc for the first recorder measuring memory, unless somebody else started it already
+    with _TRACING_LOCK:
+        if _tracing["recorders"] == 0:
+            _tracing["started"] = not tracemalloc.is_tracing()
+            if _tracing["started"]:
+                tracemalloc.start()
+        _tracing["recorders"] += 1
+
+
+def _stop_tracing():
+    # Stops tracemalloc when the last recorder measuring memory is done, if a recorder started it
+    with _TRACING_LOCK:
+        _tracing["recorders"] -= 1
+        if _tracing["recorders"] == 0 and _tracing["started"]:
+            tracemalloc.stop()
+            _tracing["started"] = False
+
+
+def _enter_stage():
+    # The peak is only reset when no other stage is measuring, a reset would erase the peak of that stage
+    with _TRACING_LOCK:
+        if _tracing["stages"] == 0:
+            tracemalloc.reset_peak()
+        _tracing["stages"] += 1
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _leave_stage(current):
+    with _TRACING_LOCK:
+        _tracing["stages"] -= 1
+        return max(0, tracemalloc.get_traced_memory()[1] - current)
+
+
+class RunRecorder:
+    """
+    Records the duration (and memory) of the stages of one analysis
+
+    Attributes:
+    mode(String): One of INSTRUMENT_MODES
+    stages(List): One dict per stage: name, start and seconds from the start of the run, peak_memory in bytes
+    info(Dict): Anything else saved in the run record, e.g. the file and the settings
+
+    """
+
+    def __init__(self, mode=None, **info):
+        if mode not in INSTRUMENT_MODES:
+            raise ValueError("Unknown instrument mode '{}', use one of: {}".format(
+                mode, ", ".join(str(name) for name in INSTRUMENT_MODES)))
+        self.mode = mode
+        self.stages = []
+        self.info = info
+        self._started = time.perf_counter()
+        self._profiler = None
+        self._tracing = False
+        if mode == "memory":
+            _start_tracing()
+            self._tracing = True                         # Stopped by close()
+        elif mode == "profile":
+            import cProfile                              # Only needed to profile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    def stage(self, name):
+        """
+        Returns a context manager which records the stage called name, while the with statement runs
+        """
+        if self.mode is None:
+            return _OFF
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        memory = self._tracing
+        if memory:
+            current = _enter_stage()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"name": name,
+                      "start": start - self._started,
+                      "seconds": time.perf_counter() - start}
+            if memory:
+                record["peak_memory"] = _leave_stage(current)
+            self.stages.append(record)
+
+    def record(self):
+        """
+        Returns the run record as a dict: the time, python, total seconds, the stages and the info
+        """
+        return {"time": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "mode": self.mode,
+                "seconds": time.perf_counter() - self._started,
+                "stages": self.stages,
+                **self.info}
+
+    def close(self):
+        """
+        Stops measuring, without writing anything. save() calls it, a run which fails before it is saved should too.
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._tracing:
+            _stop_tracing()
+            self._tracing = False
+
+    def save(self, folder):
+        """
+        Writes 'Run record.json' (and 'Run profile.prof' in "profile" mode) into folder, and stops measuring
+
+        Returns:
+        String: Path of the run record, None when nothing is measured
+
+        """
+        if self.mode is None:
+            return None
+        self.close()
+        record = self.record()
+        if self._profiler is not None:
+            record["profile"] = os.path.join(folder, "Run profile.prof")
+            self._profiler.dump_stats(record["profile"])
+            self._profiler = None
+        path = os.path.join(folder, "Run record.json")
+        with open(path, "w") as file:
+            json.dump(record, file, indent=1, default=str)
+        return path
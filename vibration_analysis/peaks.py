@@ -0,0 +1,456 @@
+"""
+Peak detection in spectra
+
+peak_pos() in the scripts used to walk the spectrum in a python loop and keep every local maximum above the mean. On
+a long spectrum most of those are noise: the mean of a spectrum is far below its noise, since a few peaks hold most of
+the power. find_peaks() does the same search on whole arrays and offers better ways of telling peaks from noise:
+
+    1. height: Only peaks above a noise floor estimated from the median and MAD of the spectrum
+    2. prominence: How far a peak stands out of the spectrum around it, small ripples on the side of a peak are ignored
+    3. distance: Of peaks closer than this many bins, only the highest is kept
+    4. top: Only the given number of highest peaks
+
+The peaks are returned as a NumPy structured array (see PEAK_DTYPE), sorted by frequency:
+
+    peaks = find_peaks(power_x, frq, prominence=0.01, top=5)
+    peaks["frequency"], peaks["amplitude"]
+
+peak_pos() returns the peaks as the (frequency, amplitude) pairs the scripts print.
+
+The frequency of a peak is that of its bin. refine_peaks() estimates the real frequency between the bins from the
+three bins around every peak (parabolic, Quinn or Jacobsen), instead of zero padding the signal to many times its
+length to get finer bins.
+
+"""
+
+from bisect import bisect_left                           # To find the neighbours of one peak
+
+import numpy as np                                       # To search the spectrum as whole arrays
+
+
+PEAK_DTYPE = np.dtype([("index", np.intp),                # Bin of the peak
+                       ("frequency", float),              # x value of the bin
+                       ("amplitude", float),              # y value of the bin
+                       ("prominence", float)])            # Height above the higher of its two bases
+
+_MAD_TO_SIGMA = 1.4826                                   # MAD * this is the standard deviation of normal noise
+_FEW_PEAKS = 16                                          # Up to this many peaks, each one is searched for directly
+
+
+def noise_floor(y_axis, factor=3.0):
+    """
+    Estimates the level below which a spectrum is noise, median + factor * 1.4826 * MAD
+
+    Parameters:
+    y_axis(Array): The spectrum
+    factor(Float): Number of standard deviations of the noise above its median
+
+    Returns:
+    Float: The noise floor
+
+    Explanation:
+    The median and the median absolute deviation (MAD) are hardly moved by the peaks, unlike the mean and the standard
+    deviation, so they describe the noise even when a few peaks hold most of the power.
+
+    """
+    y_axis = np.asarray(y_axis, dtype=float)
+    median = np.median(y_axis)
+    return median + factor * _MAD_TO_SIGMA * np.median(np.abs(y_axis - median))
+
+
+def local_maxima(y_axis):
+    """
+    Returns the indices of the bins which are higher than both their neighbours
+    """
+    y_axis = np.asarray(y_axis, dtype=float)
+    middle = y_axis[1:-1]
+    return np.flatnonzero((middle > y_axis[:-2]) & (middle > y_axis[2:])) + 1
+
+
+def _nearest_higher(heights):
+    # For every value, the index of the nearest earlier value that is higher, -1 if there is none. Every unresolved
+    # pointer jumps to the pointer of the value it points at, which is never higher than itself, so all the values
+    # are resolved together in about log2(len) vectorised rounds.
+    pointer = np.arange(-1, len(heights) - 1)
+    open_ = np.flatnonzero(pointer >= 0)
+    while len(open_):
+        open_ = open_[heights[pointer[open_]] <= heights[open_]]
+        pointer[open_] = pointer[pointer[open_]]
+        open_ = open_[pointer[open_] >= 0]
+    return pointer
+
+
+def _prominence(y_axis, peak):
+    # Prominence of a single peak, searching the spectrum directly for the nearest higher bin on each side
+    height = y_axis[peak]
+    left = y_axis[peak::-1]
+    higher = left > height
+    left = left[:np.argmax(higher)] if higher.any() else left
+    right = y_axis[peak:]
+    higher = right > height
+    right = right[:np.argmax(higher)] if higher.any() else right
+    return height - max(left.min(), right.min())
+
+
+def prominences(y_axis, peaks):
+    """
+    Calculates the prominence of the given peaks
+
+    Parameters:
+    y_axis(Array): The spectrum
+    peaks(Array): Indices of the peaks in y_axis, local maxima as returned by local_maxima()
+
+    Returns:
+    Array: The prominence of every peak
+
+    Explanation:
+    From a peak, the spectrum is followed to both sides until a higher bin (or the end of the spectrum) is reached.
+    The lowest bin on each side is a base of the peak, the prominence is the height of the peak above the higher base.
+
+    Only the bins which are at least as high as both their neighbours, and the two ends, can be the first higher bin
+    of a peak. The nearest higher one of those is found for all of them at once, in both directions. A few peaks are
+    quicker to search for one by one.
+
+    """
+    y_axis = np.asarray(y_axis, dtype=float)
+    peaks = np.asarray(peaks, dtype=np.intp)
+    if not len(peaks):
+        return np.empty(0)
+    if len(peaks) <= _FEW_PEAKS:
+        return np.array([_prominence(y_axis, peak) for peak in peaks])
+    middle = y_axis[1:-1]
+    summits = np.flatnonzero((middle >= y_axis[:-2]) & (middle >= y_axis[2:])) + 1
+    summits = np.concatenate(([0], summits, [len(y_axis) - 1]))
+    heights = y_axis[summits]
+    position = np.searchsorted(summits, peaks)
+
+    # Without a higher summit, the base is searched up to the end of the spectrum
+    left = _nearest_higher(heights)[position]
+    left = np.where(left >= 0, summits[np.maximum(left, 0)], 0)
+    right = _nearest_higher(heights[::-1])[::-1][position]
+    right = np.where(right >= 0, summits[len(summits) - 1 - np.maximum(right, 0)], len(y_axis) - 1)
+
+    # Minimum of every [left, peak] and [peak, right] range, taking every other result of reduceat(). The appended
+    # value lets the ranges end after the last bin.
+    extended = np.append(y_axis, np.inf)
+    left_base = np.minimum.reduceat(extended, np.column_stack((left, peaks + 1)).ravel())[::2]
+    right_base = np.minimum.reduceat(extended, np.column_stack((peaks, right + 1)).ravel())[::2]
+    return y_axis[peaks] - np.maximum(left_base, right_base)
+
+
+def _by_height(heights, count=None):
+    # Indices of the count highest values, from the highest down, of equal values the first. np.argpartition()
+    # would pick any of equal values, so only the count-th highest value is found with np.partition(), and the
+    # values equal to it are taken in the order of their indices.
+    count = len(heights) if count is None else min(count, len(heights))
+    if count < len(heights):
+        threshold = np.partition(heights, len(heights) - count)[len(heights) - count]
+        above = np.flatnonzero(heights > threshold)
+        order = np.concatenate((above, np.flatnonzero(heights == threshold)[:count - len(above)]))
+    else:
+        order = np.arange(len(heights))
+    return order[np.lexsort((order, -heights[order]))]
+
+
+def _walk_apart(peaks, order, distance, top=None):
+    # Goes through the peaks in the given order and keeps every peak which is not within distance of a peak kept
+    # before it, until top peaks are kept. Returns the indices of the kept peaks, sorted.
+    positions = peaks.tolist()                           # Python ints and lists are quicker one peak at a time
+    dropped = [False] * len(positions)
+    kept = []
+    for i in order.tolist():
+        if not dropped[i]:
+            kept.append(i)
+            if len(kept) == top:
+                break
+            for j in range(bisect_left(positions, positions[i] - distance + 1),
+                           bisect_left(positions, positions[i] + distance)):
+                dropped[j] = True
+    return np.sort(np.array(kept, dtype=np.intp))
+
+
+def _keep_apart(peaks, heights, distance):
+    # Of peaks closer than distance bins, only the highest is kept, as if going from the highest peak down (of equal
+    # peaks the first). In every round, the undecided peaks which beat all the undecided peaks within distance are
+    # kept, and the peaks within distance of them are dropped. Peaks are compared with their neighbours 1, 2, ...
+    # places away, as many places as there can be within distance, so every round is a few whole array operations.
+    # Long runs of ever higher peaks (a staircase) are only decided a few peaks per round, once a round decides less
+    # than a quarter of the peaks left, the rest are walked through from the highest down.
+    keep = np.zeros(len(peaks), dtype=bool)
+    undecided = np.arange(len(peaks))
+    while len(undecided):
+        positions, levels = peaks[undecided], heights[undecided]
+        reach = int((np.searchsorted(positions, positions + distance) - np.arange(len(positions))).max()) - 1
+        shifts = []
+        for shift in range(1, reach + 1):
+            close = positions[shift:] - positions[:-shift] < distance
+            shifts.append((shift, close, levels[:-shift] >= levels[shift:]))    # The earlier peak wins ties
+        best = np.ones(len(undecided), dtype=bool)
+        for shift, close, earlier in shifts:
+            best[:-shift] &= ~close | earlier
+            best[shift:] &= ~close | ~earlier
+        dropped = np.zeros(len(undecided), dtype=bool)
+        for shift, close, _ in shifts:
+            dropped[shift:] |= close & best[:-shift]
+            dropped[:-shift] |= close & best[shift:]
+        keep[undecided[best]] = True
+        left = undecided[~best & ~dropped]
+        if len(left) > 0.75 * len(undecided):
+            # None of the peaks left is within distance of a kept one, so they can be walked through on their own
+            keep[left[_walk_apart(peaks[left], _by_height(heights[left]), distance)]] = True
+            break
+        undecided = left
+    return keep
+
+
+def _highest_apart(peaks, heights, distance, top):
+    # The indices of the top highest peaks at least distance bins apart, see _keep_apart(). Going from the highest
+    # peak down, every kept peak drops at most distance - 1 peaks on each side, so the walk stops after at most
+    # top * (2 * distance - 1) peaks, and only that many of the highest peaks are sorted.
+    return _walk_apart(peaks, _by_height(heights, top * (2 * distance - 1)), distance, top)
+
+
+def find_peaks(y_axis, x_axis=None, height="noise", prominence=None, distance=None, top=None):
+    """
+    Finds the peaks of a spectrum
+
+    Parameters:
+    y_axis(Array): The spectrum
+    x_axis(Array): The frequency of every bin. By default the index of the bin.
+    height(Float or String): Peaks must be higher than this.
+                             "noise": the noise_floor() of the spectrum, "mean": the mean, like the old peak_pos(),
+                             None: every local maximum
+    prominence(Float): Peaks must stand out at least this much from the spectrum around them, see prominences()
+    distance(Int): Minimum number of bins between two peaks, the lower one of two closer peaks is dropped
+    top(Int): Return only this many of the highest peaks
+
+    Returns:
+    Array: A structured array of PEAK_DTYPE (index, frequency, amplitude, prominence), sorted by frequency
+
+    Example:
+    find_peaks([10, 20, 30, 25, 20, 10], [1, 2, 3, 4, 5, 6], height=None) returns [(2, 3., 30., 20.)]
+
+    Explanation:
+    Local maxima are found by comparing the spectrum with itself shifted by one bin to each side. The cheap tests
+    (height) are done first, and the prominence of all the local maxima is only calculated when it is used to select
+    them. With top, the peaks are kept apart going from the highest down, stopping as soon as top peaks are kept,
+    otherwise all of them are kept apart with a few array operations per round (see _keep_apart()). The top peaks
+    are picked with np.partition() without sorting the rest, of equal peaks the first ones.
+
+    """
+    y_axis = np.asarray(y_axis, dtype=float)
+    x_axis = np.arange(len(y_axis), dtype=float) if x_axis is None else np.asarray(x_axis, dtype=float)
+    if len(x_axis) != len(y_axis):
+        raise ValueError("x_axis has {} values and y_axis {}, they must be equal".format(len(x_axis), len(y_axis)))
+
+    peaks = local_maxima(y_axis)
+    if height is not None:
+        if height == "noise":
+            height = noise_floor(y_axis)
+        elif height == "mean":
+            height = y_axis.mean()
+        peaks = peaks[y_axis[peaks] > height]
+
+    if prominence is not None:
+        peaks = peaks[prominences(y_axis, peaks) >= prominence]
+
+    if distance is not None and distance > 1 and len(peaks) > 1:
+        if top is not None and top > 0:
+            peaks = peaks[_highest_apart(peaks, y_axis[peaks], distance, top)]
+        else:
+            peaks = peaks[_keep_apart(peaks, y_axis[peaks], distance)]
+
+    if top is not None and top < len(peaks):
+        peaks = peaks[np.sort(_by_height(y_axis[peaks], top))] if top > 0 else peaks[:0]
+
+    result = np.empty(len(peaks), dtype=PEAK_DTYPE)
+    result["index"] = peaks
+    result["frequency"] = x_axis[peaks]
+    result["amplitude"] = y_axis[peaks]
+    result["prominence"] = prominences(y_axis, peaks)
+    return result
+
+
+def _neighbours(spectrum, index):
+    # The bins before, at and after every peak. Peaks at the ends of the spectrum use their own bin as the
+    # missing neighbour, which gives them an offset of 0.
+    index = np.asarray(index, dtype=np.intp)
+    before = np.maximum(index - 1, 0)
+    after = np.minimum(index + 1, len(spectrum) - 1)
+    at_end = (index == before) | (index == after)
+    return spectrum[before], spectrum[index], spectrum[after], at_end
+
+
+def parabolic(spectrum, index):
+    """
+    Estimates where between the bins the peaks really are, by fitting a parabola through the three bins of each
+
+    Parameters:
+    spectrum(Array): The spectrum the peaks were found in. Of a complex spectrum, the magnitude is used.
+    index(Array): The bins of the peaks
+
+    Returns:
+    Tuple: (offsets, gains). The peaks are at index + offset (in bins, between -0.5 and 0.5), and the tops of the
+           parabolas are gain times the values at the bins.
+
+    Explanation:
+    With a, b and c the values before, at and after the peak:
+        offset = 0.5 * (a - c) / (a - 2b + c)
+        top = b - 0.25 * (a - c) * offset
+    This works with every window, but is only a rough fit of their shape: with a Hann window the offset can be off
+    by 0.05 bin, without a window (rectangular) by a quarter of a bin. quinn() and jacobsen() are better there.
+
+    """
+    spectrum = np.asarray(spectrum)
+    spectrum = np.abs(spectrum) if np.iscomplexobj(spectrum) else spectrum.astype(float)
+    a, b, c, at_end = _neighbours(spectrum, index)
+    curvature = a - 2 * b + c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offsets = np.where(at_end | (curvature == 0), 0.0, 0.5 * (a - c) / curvature)
+        gains = np.where(b == 0, 1.0, (b - 0.25 * (a - c) * offsets) / b)
+    return offsets, gains
+
+
+def _sinc_gain(offsets):
+    # A sine between two bins loses the factor sinc(offset) of its amplitude in the nearest bin (rectangular window)
+    return 1 / np.sinc(offsets)
+
+
+def jacobsen(spectrum, index):
+    """
+    Estimates where between the bins the peaks really are, from the complex values of the three bins of each
+
+    Parameters:
+    spectrum(Array): The complex spectrum (the output of fft() or rfft())
+    index(Array): The bins of the peaks
+
+    Returns:
+    Tuple: (offsets, gains), see parabolic(). The gain is that of the magnitude of the spectrum.
+
+    Explanation:
+        offset = -Re((X[k+1] - X[k-1]) / (2 X[k] - X[k-1] - X[k+1]))
+    Almost exact for a sine without a window (rectangular), it needs the complex values of the transform.
+
+    """
+    a, b, c, at_end = _neighbours(np.asarray(spectrum, dtype=complex), index)
+    denominator = 2 * b - a - c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offsets = np.where(at_end | (denominator == 0), 0.0, -((c - a) / denominator).real)
+    offsets = np.clip(offsets, -0.5, 0.5)
+    return offsets, _sinc_gain(offsets)
+
+
+def _tau(x):
+    return 0.25 * np.log(3 * x ** 2 + 6 * x + 1) - \
+        np.sqrt(6) / 24 * np.log((x + 1 - np.sqrt(2 / 3)) / (x + 1 + np.sqrt(2 / 3)))
+
+
+def quinn(spectrum, index):
+    """
+    Estimates where between the bins the peaks really are with Quinn's second estimator
+
+    Parameters:
+    spectrum(Array): The complex spectrum (the output of fft() or rfft())
+    index(Array): The bins of the peaks
+
+    Returns:
+    Tuple: (offsets, gains), see parabolic(). The gain is that of the magnitude of the spectrum.
+
+    Explanation:
+    The ratios of the neighbouring bins to the peak bin give two estimates of the offset, which are combined with
+    a correction term tau(). Of the three estimators it is the least affected by noise, for signals without a window.
+
+    """
+    a, b, c, at_end = _neighbours(np.asarray(spectrum, dtype=complex), index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio_after = (c / b).real
+        ratio_before = (a / b).real
+        after = -ratio_after / (1 - ratio_after)
+        before = ratio_before / (1 - ratio_before)
+        offsets = (after + before) / 2 + _tau(after ** 2) - _tau(before ** 2)
+    offsets = np.where(at_end | ~np.isfinite(offsets), 0.0, offsets)
+    offsets = np.clip(offsets, -0.5, 0.5)
+    return offsets, _sinc_gain(offsets)
+
+
+INTERPOLATIONS = {"parabolic": parabolic, "quinn": quinn, "jacobsen": jacobsen}
+
+
+def refine_peaks(peaks, spectrum, bin_width, method="parabolic", power=False):
+    """
+    Moves the peaks from the centres of their bins to their estimated real frequencies and amplitudes
+
+    Parameters:
+    peaks(Array): Peaks from find_peaks()
+    spectrum(Array): The spectrum the peaks are in, complex for "quinn" and "jacobsen"
+    bin_width(Float): Frequency step between two bins, Fs / n
+    method(String): "parabolic", "quinn" or "jacobsen", see those functions
+    power(Bool): True if the amplitudes of the peaks are the squares of the magnitudes of spectrum, like the scripts'
+                 power spectrum
+
+    Returns:
+    Array: A copy of peaks with the refined frequencies and amplitudes
+
+    Explanation:
+    The frequency of a peak is only known to the nearest bin, +-0.5 * Fs / n, which the scripts improve by zero
+    padding to many times the length. Interpolating between the three bins around the peak gets most of that
+    accuracy at the length of the signal, for the cost of a few divisions per peak.
+
+    Example:
+    peaks = refine_peaks(find_peaks(np.abs(x_spectrum), frq), x_spectrum, Fs / n, "quinn")
+
+    """
+    if method not in INTERPOLATIONS:
+        raise ValueError("Unknown interpolation '{}', use one of: {}".format(method, ", ".join(INTERPOLATIONS)))
+    offsets, gains = INTERPOLATIONS[method](spectrum, peaks["index"])
+    refined = peaks.copy()
+    refined["frequency"] += offsets * bin_width
+    refined["amplitude"] *= gains ** 2 if power and np.iscomplexobj(spectrum) else gains
+    return refined
+
+
+def _decimals(step):
+    # Decimals which keep 2 significant digits of step, and at least the 2 decimals the scripts print
+    step = abs(float(step))
+    return 2 if step == 0 or not np.isfinite(step) else max(2, 1 - int(np.floor(np.log10(step))))
+
+
+def peak_pos(y_axis, x_axis, spectrum=None, peak_count=10, peak_distance=3, peak_interpolation=None):
+    """
+    Identifies the peaks from the data and returns the position of the peak(Freq) and also the Amplitude of the peak
+
+    Parameters:
+    y_axis(Array): An array containing the y_axis coordinates
+    x_axis(Array): An array containing the x_axis coordinates
+    spectrum(Array): The complex FFT y_axis is the power of, to interpolate the peaks (see peak_interpolation).
+                     Without it, only "parabolic" interpolation is done, on y_axis itself.
+    peak_count(Int): At most this many of the highest peaks are returned, None for all of them
+    peak_distance(Int): Of peaks closer than this many bins, only the highest is returned
+    peak_interpolation(String): None, or the method of refine_peaks() used to estimate the peaks between the bins
+
+    Returns:
+    Array: An array containing the position of the peak as an ordered pair of the form (x, y)
+
+    Explanation:
+    A point in the graph is identified as a peak when the values both preceding and succeeding it
+     are smaller compared to itself. This is a local maxima.
+
+    Only the peaks above the noise floor of the spectrum are kept (see noise_floor()), at most peak_count of them
+    and at least peak_distance bins apart. With a peak_interpolation, their frequency and amplitude are estimated
+    between the bins. The amplitudes are rounded to 2 decimals, the frequencies to 2 significant digits of the bin
+    width (at least 2 decimals), so that a fraction of a bin found by the interpolation is not rounded away.
+
+    Then the list is returned, if there is no peak in the given input sets, then an empty array is returned.
+
+    Example:
+    peak_pos([1, 1, 1, 9, 1, 1, 2, 1], [0, 1, 2, 3, 4, 5, 6, 7]) returns [(3, 9), (6, 2)]
+
+    """
+    peaks = find_peaks(y_axis, x_axis, height="noise", distance=peak_distance, top=peak_count)
+    if spectrum is None and peak_interpolation == "parabolic":
+        spectrum = y_axis                                # e.g. a Welch average, which has no complex spectrum
+    if peak_interpolation is not None and spectrum is not None:
+        peaks = refine_peaks(peaks, spectrum, x_axis[1] - x_axis[0], peak_interpolation, power=True)
+    decimals = _decimals(x_axis[1] - x_axis[0]) if len(x_axis) > 1 else 2
+    return [(round(float(x_value), decimals), round(float(y_value), 2))
+            for x_value, y_value in zip(peaks["frequency"], peaks["amplitude"]) if round(y_value, 2) != 0]
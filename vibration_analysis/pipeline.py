@@ -0,0 +1,393 @@
+"""
+The analysis of one vibration data file, as a function
+
+'FFT v5.py' used to run its analysis at the top level of the script, so it could only analyse one file per run. The
+steps are here as functions, and analyse_file() runs all of them. The script (through cli.run()), the watch folder
+service (watch.py) and the batch mode (batch.py) all call it, so they all have the same settings:
+
+    1. The first length_fixed samples of every column are read. The stages which need the whole recording (Welch,
+       spectrogram) read it a block at a time, from a memory mapped binary file, see whole_recording().
+    2. Their mean (or trend) is removed, the window is applied and the signal is zero padded, see preprocess.py
+    3. The amplitude and power spectra are calculated with one rfft() of all the columns. The power can be Welch's
+       average over the whole recording instead, see POWER_MODES.
+    4. The spectra are written to an excel sheet and plotted in an html report, in the same layout as the script:
+
+        Output Files/
+            <time>/
+                Excel/Fourier transformed Data.xlsx
+                Graph/Report.html, the FFT and FFT Power plots of every column in one page, and optionally the
+                                   spectrogram and a zoomed band of every column
+
+    5. The peaks of the power spectrum of every column are found
+
+The spectra can be written in other formats than excel as well, see writers.py. The report is only opened in the
+browser when it is not headless. Bokeh is only imported when the plots are drawn.
+
+"""
+
+from datetime import datetime                            # To name the output folder of every analysis
+import os                                                # To create the output folders
+import shutil                                            # To delete the temporary binary files
+import tempfile                                          # To convert files without a cache for the whole recording
+
+import numpy as np                                       # To calculate the spectra
+
+from vibration_analysis.fourier import rfft, choose_length
+from vibration_analysis.ingest import read_samples, DEFAULT_COLUMNS, RAW_EXTENSIONS
+from vibration_analysis.instrument import RunRecorder
+from vibration_analysis.peaks import peak_pos
+from vibration_analysis.plan import PRECISIONS
+from vibration_analysis.preprocess import preprocess
+from vibration_analysis.recording import Recording, open_recording
+from vibration_analysis.windows import amplitude_correction
+from vibration_analysis.writers import write_results
+
+
+TIME_FORMAT = "%d-%m-%y   -   %H-%M-%S"                  # Name of the output folders, as the scripts name them
+POWER_MODES = {
+    "periodogram": "The power of the FFT of the first length_fixed samples, like the scripts",
+    "welch": "Welch's average over the whole recording, with segments of length_fixed samples, see spectral.Welch",
+}
+SPECTROGRAM_WIDTH = 750                                  # Width of the spectrogram plots, one segment group per pixel
+_SPECTROGRAM_BYTES = 2**26                               # Size of the spectra spectrogram_plots() calculates at a time
+
+
+def column_label(column):
+    """
+    Returns the name of a column used in the names of the outputs, "VibraX" is called "X" like the scripts do
+    """
+    return column[len("Vibra"):] if column.startswith("Vibra") and len(column) > len("Vibra") else column
+
+
+def spectrum(samples, length_fixed=1024, padding_mode="pad", window_type="rectangular", fs=1.0, detrend="constant",
+             precision="double"):
+    """
+    Calculates the one sided amplitude spectrum of every channel, the way the scripts do
+
+    Parameters:
+    samples(Array): channels x samples, at least length_fixed samples long
+    length_fixed(Int): Number of samples used
+    padding_mode(String): How the signal is zero padded, see fourier.PADDING_MODES
+    window_type(String): Window applied before the FFT, see windows.WINDOWS
+    fs(Float): Sampling frequency
+    detrend(String or Int): Trend removed from every channel, see preprocess.DETREND_MODES
+    precision(String): "double", or "single" to keep the samples in float32 and the spectra in complex64, see the
+                       error bounds in fourier.py
+
+    Returns:
+    Tuple: (frequencies, amplitudes, spectra)
+        frequencies(Array): Frequency of every bin, from 0 Hz to fs/2
+        amplitudes(Array): |X| / n corrected for the window, channels x bins. Their squares are the power spectrum.
+                           float32 in single precision.
+        spectra(Array): The complex rfft() of every channel
+
+    """
+    samples = np.asarray(samples)
+    length_fixed = min(length_fixed, samples.shape[1])
+    n = choose_length(length_fixed, padding_mode)
+    spectra = rfft(preprocess(samples, length_fixed, n, detrend, window_type, PRECISIONS[precision][0]), precision)
+    amplitudes = np.abs(spectra) * (amplitude_correction(window_type, length_fixed) / n)
+    frequencies = np.arange(n // 2 + 1) * fs / n
+    return frequencies, amplitudes, spectra
+
+
+def output_folder(output_path):
+    """
+    Creates the timestamped Excel and Graph folders of one analysis and returns the path of the timestamped folder
+
+    Explanation:
+    Analyses which start in the same second get the folders "<time> (2)", "<time> (3)", ... so that they never write
+    into each other's files.
+
+    """
+    time = datetime.now().strftime(TIME_FORMAT)
+    folder = os.path.join(output_path, time)
+    copy = 1
+    while True:
+        try:
+            os.makedirs(folder)                          # Fails if another analysis has taken the name already
+            break
+        except FileExistsError:
+            copy += 1
+            folder = os.path.join(output_path, "{} ({})".format(time, copy))
+    os.makedirs(os.path.join(folder, "Excel"))
+    os.makedirs(os.path.join(folder, "Graph"))
+    return folder
+
+
+def spectrum_columns(frequencies, amplitudes, labels, powers=None):
+    """
+    Returns the columns written for the spectra, with the names the scripts use
+
+    Parameters:
+    frequencies(Array): Frequency of every bin
+    amplitudes(Array): Amplitude spectrum of every channel
+    labels(List): Name of every channel, "X" gives the columns Fourier_X and FourierPower_X
+    powers(Array): Power spectrum of every channel. By default the squares of the amplitudes.
+
+    Returns:
+    Dict: Frequency, then Fourier_<label> of every channel, then FourierPower_<label>, see writers.write_results()
+
+    """
+    powers = [amplitude ** 2 for amplitude in amplitudes] if powers is None else powers
+    columns = {"Frequency": frequencies}
+    for label, amplitude in zip(labels, amplitudes):
+        columns["Fourier_" + label] = amplitude
+    for label, power in zip(labels, powers):
+        columns["FourierPower_" + label] = power
+    return columns
+
+
+def spectrum_plots(frequencies, amplitudes, powers, labels, length_fixed, y_ranges=None, levels=0):
+    """
+    Returns the amplitude and power spectrum plots of every channel, drawn from one data source
+
+    Parameters:
+    frequencies(Array): Frequency of every bin
+    amplitudes(Array): Amplitude spectrum of every channel
+    powers(Array): Power spectrum of every channel
+    labels(List): Name of every channel, "X" gives the plots "Vibration X fft" and "Vibration X fft Power"
+    length_fixed(Int): Number of samples analysed, shown in the titles
+    y_ranges(Dict): Fixed (min, max) of the y axis of the plots of a label, e.g. {"X": (-0.005, 1)}. The plots of
+                    the other labels are scaled to fit.
+    levels(Int): Finer levels of detail saved with the plots, see plotting.spectrum_plot()
+
+    Returns:
+    List: The plots, see plotting.spectrum_grid()
+
+    """
+    from bokeh.models import Range1d                     # Only needed to draw the plots
+    from vibration_analysis.plotting import spectrum_grid
+
+    y_ranges = {} if y_ranges is None else y_ranges
+    series, titles, ranges = {}, {}, {}
+    for label, amplitude, power in zip(labels, amplitudes, powers):
+        for name, values, kind in (("FFT_", amplitude, "fft"), ("FFT_Power_", power, "fft Power")):
+            name += label.lower()
+            series[name] = values
+            titles[name] = "Vibration {} {} - {} samples".format(label, kind, length_fixed)
+            if label in y_ranges:
+                ranges[name] = Range1d(*y_ranges[label])  # A range belongs to a single plot
+    return spectrum_grid(frequencies, series, titles, y_ranges=ranges, levels=levels)
+
+
+def whole_recording(path, columns, cache_dir=None, sidecar_dir=None):
+    """
+    Returns the whole recording of a file as a memory mapped recording.Recording
+
+    Parameters:
+    path(String): The excel, csv or binary file
+    columns(List): Names of the columns a csv or excel file is converted with
+    cache_dir(String): Folder of the parsed file cache, see cache.py
+    sidecar_dir(String): Folder a csv or excel file is converted into when there is no cache, see
+                         recording.open_recording(). It is up to the caller to delete it.
+
+    Explanation:
+    Binary files (ingest.RAW_EXTENSIONS) are memory mapped as they are. Csv and excel files are memory mapped from
+    their entry in the parsed file cache (see cache.load_recording()), or else from a binary sidecar in sidecar_dir.
+    Either way the file is converted block by block, so it is never loaded into the memory as a whole.
+
+    """
+    if os.path.splitext(path)[1].lower() in RAW_EXTENSIONS:
+        return open_recording(path)
+    if cache_dir is not None:
+        from vibration_analysis.cache import load_recording
+
+        return load_recording(path, columns, cache_dir=cache_dir)
+    return open_recording(path, list(columns), sidecar_dir)
+
+
+def _pool_segments(amplitudes, group):
+    # Largest amplitude of every group of segments, the last group is filled up with its last segment
+    extra = -amplitudes.shape[-2] % group
+    if extra:
+        amplitudes = np.concatenate((amplitudes, np.repeat(amplitudes[..., -1:, :], extra, axis=-2)), axis=-2)
+    return amplitudes.reshape(amplitudes.shape[:-2] + (-1, group, amplitudes.shape[-1])).max(axis=-2)
+
+
+def spectrogram_plots(recording, labels, segment_length, hop=256, fs=1.0, detrend="constant", columns=None):
+    """
+    Returns the spectrogram plot of every channel of the whole recording, see spectral.spectrogram()
+
+    Parameters:
+    recording(Recording or Array): A memory mapped recording.Recording, or the samples as channels x samples
+    labels(List): Name of every channel, used in the titles
+    segment_length(Int): Number of samples in every segment
+    hop(Int): Number of samples between the starts of two segments
+    fs(Float): Sampling frequency
+    detrend(String or Int): Trend removed from every segment, see preprocess.DETREND_MODES
+    columns(List): Columns of a Recording which are plotted. By default all of them.
+
+    Explanation:
+    The spectrogram of a long recording is much larger than the recording (segment_length // 2 + 1 bins for every
+    hop samples), and the plot only has SPECTROGRAM_WIDTH pixels across. It is calculated _SPECTROGRAM_BYTES of
+    spectra at a time, and the segments of every pixel are reduced to their largest amplitudes straight away, so
+    only the samples and spectra of one chunk are ever in memory.
+
+    """
+    from vibration_analysis.plotting import spectrogram_plot
+    from vibration_analysis.spectral import spectrogram
+
+    total = recording.samples if isinstance(recording, Recording) else recording.shape[-1]
+    if total < segment_length:
+        raise ValueError("The recording has {} samples, fewer than one segment of {}".format(total, segment_length))
+    count = (total - segment_length) // hop + 1
+    bins = segment_length // 2 + 1
+    group = -(-count // SPECTROGRAM_WIDTH)               # Segments drawn as one pixel
+    chunk = max(1, _SPECTROGRAM_BYTES // (24 * bins * len(labels) * group)) * group
+    pooled = []
+    for first in range(0, count, chunk):
+        start, stop = first * hop, (min(first + chunk, count) - 1) * hop + segment_length
+        part = recording.read(columns, start, stop) if isinstance(recording, Recording) else recording[:, start:stop]
+        _, frequencies, amplitudes = spectrogram(part, segment_length, hop, fs, detrend=detrend)
+        pooled.append(_pool_segments(amplitudes, group))
+    amplitudes = np.concatenate(pooled, axis=-2)
+    times = ((np.arange(amplitudes.shape[-2]) * group + (group - 1) / 2) * hop + segment_length / 2) / fs
+    return [spectrogram_plot(times, frequencies, amplitude, plot_width=SPECTROGRAM_WIDTH, plot_height=450,
+                             title="Vibration {} spectrogram - {} samples".format(label, segment_length))
+            for label, amplitude in zip(labels, amplitudes)]
+
+
+def zoom_plots(samples, labels, band, bins=1000, n=None, window_type="rectangular", fs=1.0, detrend="constant",
+               levels=0):
+    """
+    Returns the plot of the spectrum of the band (low, high) in Hz of every channel, see zoom.zoom_fft()
+
+    Explanation:
+    The amplitudes are divided by n, the length of the FFT of the same samples (zero padded), and corrected for the
+    window, so they have the same scale as the FFT plots.
+
+    """
+    from vibration_analysis.plotting import spectrum_plot
+    from vibration_analysis.zoom import zoom_fft
+
+    n = samples.shape[1] if n is None else n
+    windowed = preprocess(samples, detrend=detrend, window=window_type)
+    frequencies, zoomed = zoom_fft(windowed, band[0], band[1], bins, fs=fs)
+    zoomed = np.abs(zoomed) * (amplitude_correction(window_type, samples.shape[1]) / n)
+    return [spectrum_plot(frequencies, amplitude, "Vibration {} fft {} to {} Hz - {} samples".format(
+                label, band[0], band[1], samples.shape[1]), plot_width=750, plot_height=450, levels=levels)
+            for label, amplitude in zip(labels, zoomed)]
+
+
+def analyse_file(path, output_path="Output Files/", columns=DEFAULT_COLUMNS, length_fixed=1024, padding_mode="pad",
+                 window_type="rectangular", fs=1.0, peak_count=10, peak_distance=3, peak_interpolation=None,
+                 cache_dir=None, graphs=True, formats=("excel",), instrument_mode=None, detrend="constant",
+                 precision="double", power_mode="periodogram", plot_spectrogram=False, spectrogram_hop=256,
+                 zoom_band=None, zoom_bins=1000, y_ranges=None, plot_levels=0, headless=True, return_spectra=False):
+    """
+    Analyses one vibration data file like 'FFT v5.py' and writes the results into a new timestamped folder
+
+    Parameters:
+    path(String): The excel, csv or binary file, see ingest.iter_blocks()
+    output_path(String): Folder in which the timestamped output folder is created
+    columns(List): Names of the columns to analyse
+    length_fixed(Int): Number of samples analysed from the start of the file
+    padding_mode, window_type, fs, detrend, precision: See spectrum()
+    peak_count, peak_distance, peak_interpolation: See the same settings in 'FFT v5.py'
+    cache_dir(String): Folder of the parsed file cache, see cache.py. None always parses the file, and a csv or
+                       excel file is converted into a temporary binary file for the Welch average and the
+                       spectrogram, which is deleted at the end of the analysis.
+    graphs(Bool): False writes only the spectra, without the plots
+    formats(List): Formats the spectra are written in, see writers.WRITERS
+    instrument_mode(String): Measures the stages into 'Run record.json' in the output folder, see
+                             instrument.INSTRUMENT_MODES
+    power_mode(String): One of POWER_MODES
+    plot_spectrogram(Bool): Adds the spectrogram of the whole recording to the report, with segments of as many
+                            samples as are analysed, every spectrogram_hop samples, see spectrogram_plots()
+    zoom_band(Tuple): (low, high) in Hz, adds the spectrum of that band with zoom_bins bins to the report, see
+                      zoom_plots()
+    y_ranges, plot_levels: Fixed y axes and levels of detail of the FFT plots, see spectrum_plots()
+    headless(Bool): False opens the report in the browser as well
+    return_spectra(Bool): Also returns the spectra, which are left out by default to keep the summary small
+
+    Returns:
+    Dict: file(String), output(String) folder, samples(Int) analysed, length(Int) of the FFT and
+          peaks(Dict) of every column, a list of (frequency, amplitude) pairs of its power spectrum.
+          With return_spectra also frequencies(Array), amplitudes(Array) and powers(Array), channels x bins.
+
+    """
+    if power_mode not in POWER_MODES:
+        raise ValueError("Unknown power mode '{}', use one of: {}".format(power_mode, ", ".join(POWER_MODES)))
+    if graphs and plot_spectrogram and spectrogram_hop < 1:
+        raise ValueError("spectrogram_hop must be at least 1, got {}".format(spectrogram_hop))
+    temporary = None                                     # Folder of a temporary binary file of the recording
+    recorder = RunRecorder(instrument_mode, file=path, length_fixed=length_fixed, padding_mode=padding_mode,
+                           window_type=window_type, power_mode=power_mode, precision=precision)
+    try:
+        with recorder.stage("read"):
+            samples = read_samples(path, columns, max_samples=length_fixed, cache_dir=cache_dir,
+                                   dtype=PRECISIONS[precision][0])
+        if samples.shape[1] < 2:
+            raise ValueError("'{}' has {} samples, too few to analyse".format(path, samples.shape[1]))
+        with recorder.stage("spectrum"):
+            frequencies, amplitudes, spectra = spectrum(samples, length_fixed, padding_mode, window_type, fs, detrend,
+                                                        precision)
+        n = choose_length(samples.shape[1], padding_mode)    # Number of samples after zero padding
+        labels = [column_label(column) for column in columns]
+        powers = amplitudes ** 2
+
+        # The Welch average and the spectrogram use the whole recording, with segments of the samples analysed, so
+        # any file which can be analysed has at least one. It is memory mapped and read a block at a time.
+        recording = None
+        if power_mode == "welch" or (graphs and plot_spectrogram):
+            with recorder.stage("open recording"):
+                if cache_dir is None:
+                    temporary = tempfile.mkdtemp(prefix="vibration-")
+                recording = whole_recording(path, columns, cache_dir, temporary)
+        if power_mode == "welch":
+            from vibration_analysis.spectral import Welch
+
+            # Segments of the samples analysed, zero padded to the FFT length, with the same window and trend removal
+            # as the FFT. Not folded, and divided by n like spectrum() does, so it has the scale of the squares of the
+            # amplitudes.
+            with recorder.stage("welch"):
+                averager = Welch(samples.shape[1], 0.5, fs, "spectrum", window_type, detrend, fold=False, n=n)
+                for block in recording.iter_blocks(columns):
+                    averager.update(block)
+                powers = averager.psd * (samples.shape[1] / n) ** 2
+
+        folder = output_folder(output_path)
+        with recorder.stage("write"):
+            write_results(os.path.join(folder, "Excel", "Fourier transformed Data"),
+                          spectrum_columns(frequencies, amplitudes, labels, powers), formats)
+        if graphs:
+            from vibration_analysis.plotting import report
+
+            with recorder.stage("plots"):
+                plots = spectrum_plots(frequencies, amplitudes, powers, labels, samples.shape[1], y_ranges,
+                                       plot_levels)
+            if plot_spectrogram:
+                with recorder.stage("spectrogram"):
+                    plots += spectrogram_plots(recording, labels, samples.shape[1], spectrogram_hop, fs, detrend,
+                                               columns)
+            if zoom_band is not None:
+                with recorder.stage("zoom"):
+                    plots += zoom_plots(samples, labels, zoom_band, zoom_bins, n, window_type, fs, detrend,
+                                        plot_levels)
+            with recorder.stage("report"):
+                report(os.path.join(folder, "Graph", "Report.html"), plots,
+                       "Vibration Analysis - " + os.path.basename(folder), headless=headless)
+
+        # The Welch average has no complex spectrum of its own, its peaks can only be interpolated from the power
+        # itself (parabolic), the spectrum of the first samples would give other peaks
+        with recorder.stage("peaks"):
+            complex_spectra = spectra if power_mode == "periodogram" else [None] * len(columns)
+            peaks = {column: peak_pos(power, frequencies, complex_spectrum, peak_count, peak_distance,
+                                      peak_interpolation)
+                     for column, power, complex_spectrum in zip(columns, powers, complex_spectra)}
+        recorder.save(folder)
+    finally:
+        recorder.close()                                 # Stops measuring when the analysis failed
+        if temporary is not None:
+            recording = None                             # Unmaps the file, so that it can be deleted
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    result = {"file": path,
+              "output": folder,
+              "samples": samples.shape[1],
+              "length": n,
+              "peaks": peaks}
+    if return_spectra:
+        result.update(frequencies=frequencies, amplitudes=amplitudes, powers=powers)
+    return result
@@ -0,0 +1,368 @@
+"""
+Precomputed transform plans
+
+Every Fourier Transform of a given length needs the same bit reversed order of the samples and the same twiddle
+factors exp(-2j * pi * p / length) for every pass of butterflies. Calculating them is a large part of the cost of
+a transform, while the scripts always run the same few lengths (1024, 2048, 4096, ...) over and over again for the
+X axis, the Y axis and for every input file.
+
+A plan holds those tables for one length:
+
+    1. FFTPlan: lengths which are a power of 2, radix 2 butterflies
+    2. MixedRadixPlan: lengths made of the factors 2, 3 and 5, e.g. 1000 or 4320
+    3. BluesteinPlan: any other length, calculated as a convolution with power of 2 transforms
+
+A plan is made in double precision (complex128 tables) or in single precision (complex64 tables, for float32
+signals), see PRECISIONS. Both are cached, under their own keys.
+
+Plans are kept in a cache with a limit on the memory they may use.
+When the limit is crossed, the plan which was used the longest time ago is thrown away (Least Recently Used).
+
+    get_plan(1024)                      # First call builds the plan
+    get_plan(1024)                      # Every call after that returns the same plan from the cache
+    set_plan_cache_limit(16 * 2**20)    # Keep at most 16 MB of plans
+
+"""
+
+from collections import OrderedDict                      # To remember the order in which plans were used
+from cmath import pi, exp                                # To calculate the twiddle factors
+import sys                                               # To measure the size of python lists
+import threading                                         # To share the cache between threads safely
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+PRECISIONS = {
+    "double": ("float64", "complex128"),                 # NumPy types of the samples and of the spectra
+    "single": ("float32", "complex64"),                  # Half the memory, about 7 significant digits
+}
+
+
+def is_power_2(x):
+    """
+    Checks if the given number is a power of 2
+
+    Parameter:
+    x(Int): A positive integer
+
+    Returns:
+    Bool: True if x is 1, 2, 4, 8, 16, ...
+
+    Explanation:
+    A power of 2 has exactly one bit set, so removing the lowest bit (x & (x - 1)) leaves 0.
+
+    """
+    return x > 0 and x & (x - 1) == 0
+
+
+def bit_reverse_indices(n):
+    """
+    Returns the bit reversed order of the indices 0 to n-1
+
+    Parameter:
+    n(Int): Length of the signal, a power of 2
+
+    Returns:
+    Array: An array of n indices, index i holds the value of i with its log2(n) bits reversed
+
+    Example:
+    bit_reverse_indices(8) returns [0, 4, 2, 6, 1, 5, 3, 7]
+
+    """
+    bits = n.bit_length() - 1
+    if np is None:
+        return [int(format(i, '0{}b'.format(bits))[::-1], 2) if bits else 0 for i in range(n)]
+    indices = np.arange(n)
+    reversed_indices = np.zeros(n, dtype=np.intp)
+    for _ in range(bits):
+        reversed_indices = (reversed_indices << 1) | (indices & 1)
+        indices >>= 1
+    return reversed_indices
+
+
+def _twiddles(length):
+    # Twiddle factors for one pass of butterflies, same expression as the original recursive fft()
+    return [exp(-2j * pi * p / length) for p in range(length // 2)]
+
+
+def _size_of(table):
+    if np is not None:
+        return table.nbytes
+    return sys.getsizeof(table) + sum(sys.getsizeof(value) for value in table)
+
+
+class FFTPlan:
+    """
+    Precomputed tables for the Fourier Transform of one length
+
+    Attributes:
+    length(Int): Number of samples the plan is made for, a power of 2
+    bit_reverse(Array): Order in which the samples are read before the first pass of butterflies
+    twiddles(List): Twiddle factors for every pass of butterflies, for transform lengths 2, 4, 8, ... length
+    nbytes(Int): Memory used by the tables in bytes
+
+    """
+
+    def __init__(self, length):
+        if not is_power_2(length):
+            raise ValueError("A plan needs a length which is a power of 2, got {}. "
+                             "Use zero_pad() on the signal first".format(length))
+        self.length = length
+        self.bit_reverse = bit_reverse_indices(length)
+        self.twiddles = []
+        size = 2
+        while size <= length:
+            twiddles = _twiddles(size)
+            self.twiddles.append(twiddles if np is None else np.array(twiddles))
+            size *= 2
+        self.nbytes = _size_of(self.bit_reverse) + sum(_size_of(table) for table in self.twiddles)
+
+    def __repr__(self):
+        return "FFTPlan(length={}, nbytes={})".format(self.length, self.nbytes)
+
+
+def factorise(length):
+    """
+    Splits a length into the radices 2, 3 and 5
+
+    Parameter:
+    length(Int): A positive integer
+
+    Returns:
+    List: The radices whose product is the length, largest first, or None if the length has any other prime factor
+
+    Example:
+    factorise(60) returns [5, 3, 2, 2]
+    factorise(4097) returns None, as 4097 = 17 * 241
+
+    """
+    factors = []
+    for radix in (5, 3, 2):
+        while length % radix == 0:
+            factors.append(radix)
+            length //= radix
+    return factors if length == 1 else None
+
+
+class MixedRadixPlan:
+    """
+    Precomputed tables for the Fourier Transform of a length made of the factors 2, 3 and 5 (e.g. 1000, 4320, 6000)
+
+    Attributes:
+    length(Int): Number of samples the plan is made for
+    factors(List): Radix used at every level of the decomposition, see factorise()
+    twiddles(List): For every level, an array of shape (radix, length_of_level / radix) of twiddle factors
+    dft_matrices(Dict): The small radix x radix DFT matrix for every radix used
+    nbytes(Int): Memory used by the tables in bytes
+
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.factors = factorise(length)
+        if self.factors is None:
+            raise ValueError("A mixed radix plan needs a length made of the factors 2, 3 and 5, got {}".format(length))
+        self.twiddles = []
+        size = length
+        for radix in self.factors:
+            rows, columns = np.meshgrid(np.arange(radix), np.arange(size // radix), indexing='ij')
+            self.twiddles.append(np.exp(-2j * np.pi * (rows * columns) / size))
+            size //= radix
+        self.dft_matrices = {}
+        for radix in set(self.factors):
+            rows, columns = np.meshgrid(np.arange(radix), np.arange(radix), indexing='ij')
+            self.dft_matrices[radix] = np.exp(-2j * np.pi * (rows * columns) / radix)
+        self.nbytes = sum(table.nbytes for table in self.twiddles) + \
+            sum(table.nbytes for table in self.dft_matrices.values())
+
+    def __repr__(self):
+        return "MixedRadixPlan(length={}, factors={}, nbytes={})".format(self.length, self.factors, self.nbytes)
+
+
+class BluesteinPlan:
+    """
+    Precomputed tables for the Fourier Transform of any other length (e.g. a prime number of samples)
+
+    Attributes:
+    length(Int): Number of samples the plan is made for
+    inner_length(Int): The power of 2, at least 2 * length - 1, used for the convolution
+    chirp(Array): exp(-1j * pi * k^2 / length) for k = 0 to length - 1
+    filter(Array): Fourier Transform of the conjugated chirp, laid out for a circular convolution of inner_length
+    nbytes(Int): Memory used by the tables in bytes. The plan of inner_length is cached on its own.
+
+    Explanation:
+    Using n*k = (n^2 + k^2 - (k-n)^2) / 2, the transform becomes a convolution of the signal multiplied by the chirp
+    with the conjugated chirp. The convolution is done with power of 2 transforms, so any length costs about
+    as much as two transforms of 2 to 4 times its length.
+
+    """
+
+    def __init__(self, length):
+        from vibration_analysis.fourier import fft       # Imported here, fourier.py itself depends on this module
+
+        self.length = length
+        self.inner_length = 1 << (2 * length - 2).bit_length()
+        if np is None:
+            self.chirp = [exp(-1j * pi * (k * k % (2 * length)) / length) for k in range(length)]
+            chirp_filter = [0j] * self.inner_length
+            for k in range(length):
+                chirp_filter[k] = chirp_filter[-k] = self.chirp[k].conjugate()
+        else:
+            k = np.arange(length)
+            self.chirp = np.exp(-1j * np.pi * ((k * k) % (2 * length)) / length)   # k^2 is reduced to keep precision
+            chirp_filter = np.zeros(self.inner_length, dtype=complex)
+            chirp_filter[:length] = np.conj(self.chirp)
+            chirp_filter[self.inner_length - length + 1:] = np.conj(self.chirp[:0:-1])
+        self.filter = fft(chirp_filter)
+        self.nbytes = _size_of(self.chirp) + _size_of(self.filter)
+
+    def __repr__(self):
+        return "BluesteinPlan(length={}, inner_length={}, nbytes={})".format(self.length, self.inner_length,
+                                                                             self.nbytes)
+
+
+def _single(plan):
+    # Rounds the tables of a plan, calculated in double precision, to single precision (complex64)
+    def cast(table):
+        return table.astype(np.complex64)
+
+    if isinstance(plan, FFTPlan):
+        plan.twiddles = [cast(table) for table in plan.twiddles]
+        plan.nbytes = _size_of(plan.bit_reverse) + sum(_size_of(table) for table in plan.twiddles)
+    elif isinstance(plan, MixedRadixPlan):
+        plan.twiddles = [cast(table) for table in plan.twiddles]
+        plan.dft_matrices = {radix: cast(table) for radix, table in plan.dft_matrices.items()}
+        plan.nbytes = sum(table.nbytes for table in plan.twiddles) + \
+            sum(table.nbytes for table in plan.dft_matrices.values())
+    else:
+        plan.chirp = cast(plan.chirp)
+        plan.filter = cast(plan.filter)
+        plan.nbytes = _size_of(plan.chirp) + _size_of(plan.filter)
+    plan.precision = "single"
+    return plan
+
+
+def make_plan(length, precision="double"):
+    """
+    Builds the plan for the given transform length, without using the cache
+
+    Parameter:
+    length(Int): Number of samples of the transform
+    precision(String): "double" or "single", see PRECISIONS. Without NumPy plans are always double.
+
+    Returns:
+    FFTPlan if the length is a power of 2, MixedRadixPlan if it is made of the factors 2, 3 and 5,
+    otherwise BluesteinPlan. Without NumPy only FFTPlan and BluesteinPlan are used.
+
+    Explanation:
+    Single precision tables are calculated in double precision and rounded once, so their only error is that
+    rounding.
+
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '{}', use one of: {}".format(precision, ", ".join(PRECISIONS)))
+    if is_power_2(length):
+        plan = FFTPlan(length)
+    elif np is not None and factorise(length) is not None:
+        plan = MixedRadixPlan(length)
+    else:
+        plan = BluesteinPlan(length)
+    plan.precision = "double"
+    if precision == "single" and np is not None:
+        plan = _single(plan)
+    return plan
+
+
+_plans = OrderedDict()                                   # Cached plans, the most recently used one is at the end
+_cache_lock = threading.Lock()
+_cache_limit = 256 * 2**20                               # Memory limit of the cache in bytes
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _evict():
+    # Throw away the least recently used plans until the cache fits in the limit.
+    # The newest plan is always kept, even if it is larger than the limit on its own.
+    total = sum(plan.nbytes for plan in _plans.values())
+    while len(_plans) > 1 and total > _cache_limit:
+        _, plan = _plans.popitem(last=False)
+        total -= plan.nbytes
+
+
+def get_plan(length, precision="double"):
+    """
+    Returns the plan for the given transform length, building it only if it is not in the cache
+
+    Parameter:
+    length(Int): Number of samples of the transform
+    precision(String): "double" or "single", see PRECISIONS
+
+    Returns:
+    The plan for that length, see make_plan()
+
+    """
+    key = length if precision == "double" else (length, precision)   # Double plans are cached by length alone
+    with _cache_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return plan
+        _cache_stats["misses"] += 1
+
+    plan = make_plan(length, precision)                  # Built outside the lock, other threads are not blocked
+
+    with _cache_lock:
+        if _cache_limit > 0:
+            _plans[key] = plan
+            _plans.move_to_end(key)
+            _evict()
+    return plan
+
+
+def set_plan_cache_limit(nbytes):
+    """
+    Changes the amount of memory the plan cache may use
+
+    Parameter:
+    nbytes(Int): Memory limit in bytes. 0 turns the cache off.
+
+    """
+    global _cache_limit
+    if nbytes < 0:
+        raise ValueError("The plan cache limit can not be negative, got {}".format(nbytes))
+    with _cache_lock:
+        _cache_limit = nbytes
+        if nbytes == 0:
+            _plans.clear()
+        else:
+            _evict()
+
+
+def clear_plan_cache():
+    """
+    Removes all plans from the cache
+    """
+    with _cache_lock:
+        _plans.clear()
+        _cache_stats["hits"] = _cache_stats["misses"] = 0
+
+
+def plan_cache_info():
+    """
+    Returns the state of the plan cache
+
+    Returns:
+    Dict: lengths(List) of the cached plans from least to most recently used (single precision plans as
+          (length, "single")), nbytes(Int) used by them, limit(Int) of the cache in bytes, and the number of hits
+          and misses since the cache was last cleared
+
+    """
+    with _cache_lock:
+        return {"lengths": list(_plans),
+                "nbytes": sum(plan.nbytes for plan in _plans.values()),
+                "limit": _cache_limit,
+                "hits": _cache_stats["hits"],
+                "misses": _cache_stats["misses"]}
@@ -0,0 +1,284 @@
+"""
+Bokeh plots of the analysis results
+
+spectrum_plot() draws a spectrum with plot.line(), like the scripts do. A spectrogram has a value for every time and
+frequency, so it is drawn as an image instead, with a colour bar for the amplitude. spectrum_grid() draws many
+spectra from one data source and report() saves all the plots of an analysis as one html page.
+
+A standalone html file holds every point of its plots. A spectrum of 500k bins makes a file of tens of MB which the
+browser takes seconds to draw, for a plot only 1500 pixels wide. The plots are therefore decimated to what can be
+seen:
+
+    1. minmax_decimate() keeps the smallest and the largest value of every pixel column, in their order, so the line
+       looks the same as with every bin and no peak is lost
+    2. With levels, finer decimations are saved too, and the plot switches to the finest one which fits the visible
+       range when it is zoomed in, see spectrum_plot()
+    3. The spectrogram image is reduced to at most one value per pixel, keeping the largest amplitude
+
+The size of the html files and the time to draw them then depend on the size of the plots, not on the FFT length.
+
+"""
+
+import os                                                # To open the report in the browser
+
+import numpy as np                                       # To find the range of the amplitudes
+from bokeh.plotting import figure                        # To plot the figure
+from bokeh.models import ColorBar, LinearColorMapper     # To map the amplitudes to colours
+from bokeh.models import ColumnDataSource, CustomJS      # To switch between the levels of detail when zooming
+
+
+def _minmax_indices(y, columns):
+    # Positions of the smallest and largest value of every one of columns equal slices of y, in their order
+    n = len(y)
+    if n <= 2 * columns:
+        return np.arange(n)
+    size = -(-n // columns)                              # Points per slice, the last slice is padded with its end
+    slices = -(-n // size)
+    padded = np.empty(slices * size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    padded = padded.reshape(slices, size)
+    start = np.arange(slices) * size
+    lowest = np.minimum(start + padded.argmin(axis=1), n - 1)
+    highest = np.minimum(start + padded.argmax(axis=1), n - 1)
+    return np.sort(np.stack([lowest, highest], axis=1), axis=1).ravel()
+
+
+def minmax_decimate(x, y, columns):
+    """
+    Reduces a line to the smallest and largest value of every one of columns equal slices, in their order
+
+    Parameters:
+    x(Array): x of every point, sorted
+    y(Array): y of every point
+    columns(Int): Number of slices, the number of pixels the plot is wide
+
+    Returns:
+    Tuple: (x, y) of at most 2 * columns points. Lines which are short enough already are returned unchanged.
+
+    Explanation:
+    Drawing the line through the minimum and maximum of every pixel column gives the same pixels as drawing every
+    point, since the line covers the whole range between them anyway. Unlike taking every n-th point, no peak can
+    fall between the points kept.
+
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    keep = _minmax_indices(y, columns)
+    return x[keep], y[keep]
+
+
+def _decimated(x, series, columns):
+    # The columns of a data source holding x and every series, keeping the points any of the series needs
+    keep = np.unique(np.concatenate([_minmax_indices(np.asarray(values), columns) for values in series.values()]))
+    data = {"x": np.asarray(x)[keep]}
+    data.update((name, np.asarray(values)[keep]) for name, values in series.items())
+    return data
+
+
+# Switches the data source to the finest level of detail which has at most budget points in the visible x range,
+# and only sends those points (and one either side) to the renderers
+_LEVEL_OF_DETAIL = """
+const start = x_range.start, end = x_range.end;
+function first(x, value) {
+    let low = 0, high = x.length;
+    while (low < high) {
+        const middle = (low + high) >> 1;
+        if (x[middle] < value) { low = middle + 1; } else { high = middle; }
+    }
+    return low;
+}
+let data = levels[0].data, low = 0, high = data.x.length;
+for (const level of levels) {
+    const x = level.data.x;
+    const from = Math.max(first(x, start) - 1, 0), to = Math.min(first(x, end) + 1, x.length);
+    if (level !== levels[0] && to - from > budget) { break; }
+    data = level.data; low = from; high = to;
+}
+const visible = {};
+for (const name in data) { visible[name] = Array.from(data[name].slice(low, high)); }
+source.data = visible;
+"""
+
+
+def _data_source(x_range, x, series, columns, levels):
+    # One data source for x and every series, decimated to columns pixels, with levels finer levels of detail
+    # which are switched to when x_range is zoomed in
+    data = _decimated(x, series, columns)
+    source = ColumnDataSource(data)
+    if levels and len(data["x"]) < len(x):
+        sources = [ColumnDataSource(data)]
+        for level in range(1, levels + 1):
+            sources.append(ColumnDataSource(_decimated(x, series, columns * 4 ** level)))
+            if len(sources[-1].data["x"]) == len(x):
+                break
+        callback = CustomJS(args={"source": source, "levels": sources, "x_range": x_range, "budget": 2 * columns},
+                            code=_LEVEL_OF_DETAIL)
+        x_range.js_on_change("start", callback)
+        x_range.js_on_change("end", callback)
+    return source
+
+
+def _extent(centres):
+    # Start and width of the image along one axis, so that every pixel is centred on its time or frequency
+    step = centres[1] - centres[0] if len(centres) > 1 else 1
+    return centres[0] - step / 2, step * len(centres)
+
+
+def _max_pool(values, size, axis):
+    # Largest value of every group of values along axis, so that there are at most size of them
+    n = values.shape[axis]
+    group = -(-n // size)
+    if group <= 1:
+        return values
+    values = np.moveaxis(values, axis, 0)
+    padded = np.concatenate([values, np.repeat(values[-1:], -n % group, axis=0)])
+    pooled = padded.reshape((-1, group) + values.shape[1:]).max(axis=1)
+    return np.moveaxis(pooled, 0, axis)
+
+
+def spectrogram_plot(times, frequencies, amplitudes, title="Spectrogram", palette="Viridis256",
+                     plot_width=1500, plot_height=700):
+    """
+    Draws a spectrogram as a Bokeh image, time on the x axis and frequency on the y axis
+
+    Parameters:
+    times(Array): Time of every segment, see spectral.spectrogram()
+    frequencies(Array): Frequency of every bin
+    amplitudes(Array): Array of segments x bins
+    title(String): Title of the plot
+    palette(String): Name of a Bokeh palette for the amplitudes
+    plot_width(Int): Width of the plot
+    plot_height(Int): Height of the plot
+
+    Returns:
+    Figure: The Bokeh figure, to be saved with output_file() and show() like the other plots
+
+    """
+    amplitudes = _max_pool(_max_pool(np.asarray(amplitudes), plot_width, axis=0), plot_height, axis=1)
+    x, width = _extent(times)
+    y, height = _extent(frequencies)
+    mapper = LinearColorMapper(palette=palette, low=float(amplitudes.min()), high=float(amplitudes.max()))
+    plot = figure(title=title,
+                  x_axis_label='Time (s)',
+                  y_axis_label='Frequency (Hz)',
+                  x_range=(x, x + width),
+                  y_range=(y, y + height),
+                  plot_width=plot_width,
+                  plot_height=plot_height)
+    plot.image(image=[np.ascontiguousarray(amplitudes.T)], x=x, y=y, dw=width, dh=height, color_mapper=mapper)
+    plot.add_layout(ColorBar(color_mapper=mapper, label_standoff=12), 'right')
+    return plot
+
+
+def spectrum_plot(frequencies, values, title="Spectrum", y_axis_label="Amplitude (g)", y_range=None,
+                  plot_width=1500, plot_height=700, levels=0):
+    """
+    Draws a spectrum as a line, like the FFT plots of the scripts
+
+    Parameters:
+    frequencies(Array): Frequency of every bin
+    values(Array): Amplitude or power of every bin
+    title(String): Title of the plot
+    y_axis_label(String): Label of the y axis
+    y_range(Tuple): (min, max) of the y axis. By default it fits the values.
+    plot_width(Int): Width of the plot
+    plot_height(Int): Height of the plot
+    levels(Int): Number of finer levels of detail saved with the plot, each 4 times finer than the one before. 0 only
+                 saves the line decimated to the width of the plot, see minmax_decimate().
+
+    Returns:
+    Figure: The Bokeh figure
+
+    Explanation:
+    Without levels zooming in shows the decimated line, which is exact at full width only. With levels, the plot
+    shows the finest level which has at most 2 * plot_width points in the visible range, so zooming in by 4^levels
+    still shows every pixel exactly. The last level is the spectrum itself once it is fine enough. The html file
+    grows with 4^levels, not with the length of the spectrum.
+
+    """
+    options = {} if y_range is None else {"y_range": y_range}
+    plot = figure(title=title,
+                  x_axis_label='Frequency (Hz)',
+                  y_axis_label=y_axis_label,
+                  plot_width=plot_width,
+                  plot_height=plot_height,
+                  **options)
+    source = _data_source(plot.x_range, frequencies, {"y": values}, plot_width, levels)
+    plot.line("x", "y", source=source)
+    return plot
+
+
+def spectrum_grid(frequencies, series, titles=None, y_axis_labels=None, y_ranges=None, plot_width=750,
+                  plot_height=450, levels=0):
+    """
+    Draws every series as a spectrum of its own, all from one data source and with one linked frequency axis
+
+    Parameters:
+    frequencies(Array): Frequency of every bin
+    series(Dict): Name of every series mapped to its amplitude or power of every bin
+    titles(Dict): Title of the plot of every series, by default its name
+    y_axis_labels(Dict): Label of the y axis of every series, "Amplitude (g)" by default
+    y_ranges(Dict): (min, max) of the y axis of the series which should not fit their values
+    plot_width(Int): Width of every plot
+    plot_height(Int): Height of every plot
+    levels(Int): Finer levels of detail saved with the plots, see spectrum_plot()
+
+    Returns:
+    List: One Bokeh figure per series, in the order of series, to be laid out with report()
+
+    Explanation:
+    The frequencies are saved in the html file once instead of once per plot, and a bin is kept by the decimation
+    when any of the series needs it. Zooming or panning one plot moves all of them.
+
+    """
+    titles = titles or {}
+    y_axis_labels = y_axis_labels or {}
+    y_ranges = y_ranges or {}
+    plots = []
+    for name in series:
+        options = {"y_range": y_ranges[name]} if name in y_ranges else {}
+        if plots:
+            options["x_range"] = plots[0].x_range
+        plot = figure(title=titles.get(name, name),
+                      x_axis_label='Frequency (Hz)',
+                      y_axis_label=y_axis_labels.get(name, "Amplitude (g)"),
+                      plot_width=plot_width,
+                      plot_height=plot_height,
+                      **options)
+        if not plots:
+            source = _data_source(plot.x_range, frequencies, series, plot_width, levels)
+        plot.line("x", name, source=source)
+        plots.append(plot)
+    return plots
+
+
+def report(path, plots, title="Vibration Analysis", ncols=2, headless=False):
+    """
+    Saves all the plots as one html file, in a grid of ncols columns
+
+    Parameters:
+    path(String): Path of the html file
+    plots(List): The Bokeh figures, None leaves a cell empty
+    title(String): Title of the html page
+    ncols(Int): Number of plots side by side
+    headless(Bool): True only saves the file, False opens it in the browser as well
+
+    Returns:
+    String: Path of the html file
+
+    Explanation:
+    BokehJS is linked from its CDN once for the whole report, and nothing needs a browser or a display when
+    headless, so reports can be written on servers.
+
+    """
+    from bokeh.io import save                            # Only needed to write the report
+    from bokeh.layouts import gridplot
+    from bokeh.resources import CDN
+
+    path = save(gridplot(list(plots), ncols=ncols), path, resources=CDN, title=title)
+    if not headless:
+        import webbrowser                                # Only needed to open the report
+
+        webbrowser.open("file://" + os.path.abspath(path))
+    return path
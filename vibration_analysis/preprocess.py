@@ -0,0 +1,136 @@
+"""
+Preparing the samples for the Fourier Transform
+
+Before the FFT the scripts removed the mean of every column with a python loop over the rows, copied the samples
+into new lists with another loop and appended the zeros of the padding one at a time. preprocess() does all of it
+for every channel at once, with a handful of array operations and no python lists:
+
+    1. The samples are taken as one contiguous channels x samples array of the chosen dtype (float64 or float32)
+    2. The trend is removed: the mean (DC), a straight line, or a polynomial fitted by least squares
+    3. The window is applied, see windows.py
+    4. The result is written into a preallocated, zero padded buffer of the FFT length
+
+Removing a slow drift of the sensor (linear or polynomial detrending) keeps its energy out of the lowest bins,
+where it would hide the low frequency vibrations.
+
+"""
+
+from functools import lru_cache                          # To fit every polynomial basis only once
+
+import numpy as np                                       # To process all the channels at once
+
+from vibration_analysis.windows import window_table
+
+
+DETREND_MODES = {
+    None: "The samples are used as they are",
+    "constant": "The mean (DC offset) of every channel is removed, like the scripts do",
+    "linear": "The straight line fitted to every channel is removed",
+}                                                        # An Int removes the polynomial of that degree
+
+
+def parse_detrend(text):
+    """
+    Returns the detrend mode given as text on a command line: "none" is None, digits are the degree of a polynomial
+
+    Example:
+    parse_detrend("2") returns 2, parse_detrend("linear") returns "linear"
+
+    """
+    if text.strip().lower() == "none":
+        return None
+    if text.strip().isdigit():
+        return int(text)
+    _degree(text)                                        # Raises a ValueError for an unknown mode
+    return text
+
+
+def _degree(detrend):
+    # Degree of the polynomial removed by a detrend mode, -1 for none
+    if detrend is None:
+        return -1
+    if detrend == "constant":
+        return 0
+    if detrend == "linear":
+        return 1
+    if isinstance(detrend, (int, np.integer)) and not isinstance(detrend, bool) and detrend >= 0:
+        return int(detrend)
+    raise ValueError("Unknown detrend mode {!r}, use None, 'constant', 'linear' or a polynomial degree".format(
+        detrend))
+
+
+@lru_cache(maxsize=32)
+def _polynomial_basis(length, degree):
+    # The basis of polynomials up to degree over length samples, and its pseudo inverse, which gives the least
+    # squares coefficients. The samples are mapped onto [-1, 1] so that high degrees stay well conditioned.
+    t = np.linspace(-1, 1, length) if length > 1 else np.zeros(length)
+    basis = np.polynomial.legendre.legvander(t, degree)
+    inverse = np.linalg.pinv(basis)
+    basis.flags.writeable = False
+    inverse.flags.writeable = False
+    return basis, inverse
+
+
+def trend(samples, detrend="constant"):
+    """
+    Returns the trend of every channel that preprocess() removes, see DETREND_MODES
+
+    Parameters:
+    samples(Array): A 1-D signal, or channels x samples
+    detrend(String or Int): None, "constant", "linear" or the degree of a polynomial
+
+    Returns:
+    Array: The trend, of the same shape as samples
+
+    """
+    samples = np.asarray(samples)
+    degree = _degree(detrend)
+    if degree < 0:
+        return np.zeros_like(samples)
+    if degree == 0:
+        return np.broadcast_to(samples.mean(axis=-1, keepdims=True), samples.shape)
+    basis, inverse = _polynomial_basis(samples.shape[-1], degree)
+    return (samples @ inverse.T) @ basis.T
+
+
+def preprocess(samples, length=None, n=None, detrend="constant", window=None, dtype=np.float64, out=None):
+    """
+    Removes the trend of every channel, applies the window and zero pads, in one preallocated buffer
+
+    Parameters:
+    samples(Array): A 1-D signal, or channels x samples
+    length(Int): Number of samples used from the start of every channel. By default all of them.
+    n(Int): Length of the result, at least length, the samples are followed by zeros. By default length.
+    detrend(String or Int): See DETREND_MODES, or the degree of a polynomial
+    window(String or Array): Window applied after the trend is removed, see windows.WINDOWS. None for no window.
+    dtype(Type): np.float64, or np.float32 to halve the memory of long recordings
+    out(Array): Buffer of shape (..., n) and dtype to write into, e.g. to reuse it for many files
+
+    Returns:
+    Array: channels x n (or n for a 1-D signal), C contiguous
+
+    Example:
+    padded = preprocess(samples, 1000, 1024, detrend="linear", window="hann")     # 1000 samples, 24 zeros
+
+    """
+    samples = np.asarray(samples)
+    length = samples.shape[-1] if length is None else min(length, samples.shape[-1])
+    n = length if n is None else n
+    if n < length:
+        raise ValueError("The result is {} samples long, too short for the {} samples".format(n, length))
+    if out is None:
+        out = np.empty(samples.shape[:-1] + (n,), dtype=dtype)
+    elif out.shape != samples.shape[:-1] + (n,):
+        raise ValueError("out has the shape {}, but {} is needed".format(out.shape, samples.shape[:-1] + (n,)))
+
+    body = out[..., :length]
+    body[...] = samples[..., :length]                    # One copy, converted to the dtype of out
+    degree = _degree(detrend)
+    if degree == 0:
+        body -= body.mean(axis=-1, keepdims=True)
+    elif degree > 0:
+        body -= trend(body, degree)
+    if window is not None:
+        body *= window_table(window, length)
+    out[..., length:] = 0
+    return out
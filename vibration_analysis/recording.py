@@ -0,0 +1,336 @@
+"""
+Memory mapped recordings
+
+The data loggers write captures of several GB, interleaved binary samples of every channel one after the other:
+
+    X0 Y0 Z0 X1 Y1 Z1 X2 Y2 Z2 ...
+
+Such a file can not go through pd.read_excel(), and even loading it into one array needs more memory than the
+machine may have. A Recording memory maps the file instead. Nothing is read until it is used, and only the pages
+used are read:
+
+    1. channel() and view() are strided views of the raw samples of one or all channels, no sample is copied
+    2. read() and iter_blocks() convert a range of samples to floats (scaled to g), one block at a time
+    3. The Welch and STFT functions of spectral.py take those views and process them segment batch by segment batch,
+       so recordings larger than the memory can be analysed
+
+The samples can be 16, 24 or 32 bit integers or 32 or 64 bit floats, see SAMPLE_FORMATS. Their layout is given by
+a small JSON description next to the file, "<file>.json":
+
+    {"columns": ["VibraX", "VibraY", "VibraZ"], "format": "int24", "scale": 1.2e-7, "offset": 512}
+
+offset is the size of any header before the first sample, scale turns the integers into g, and byteorder ("<" for
+little endian, the default, or ">") the order of the bytes of every sample. Files with the extensions in
+ingest.RAW_EXTENSIONS are read this way by ingest.iter_blocks(), so the whole package can analyse them.
+
+CSV and excel files can be converted once into such a binary file, a sidecar, with convert(). open_recording()
+does it automatically and converts the file again only when it has changed. The parsed file cache (cache.py) keeps
+its entries as sidecars too, so a file parsed once can be read both ways.
+
+"""
+
+import hashlib                                           # To tell a changed source file from a touched one
+import json                                              # To read and write the descriptions of the binary files
+import os                                                # To find the sidecar files and check they are up to date
+import threading                                         # To name the temporary files of every writer
+
+import numpy as np                                       # To memory map the samples
+
+from vibration_analysis.ingest import RAW_EXTENSIONS
+
+
+SAMPLE_FORMATS = {                                       # Bytes of every sample and the NumPy type it is read as
+    "int16": (2, "i2"),
+    "int24": (3, None),                                  # No NumPy type, read as 3 bytes and converted
+    "int32": (4, "i4"),
+    "float32": (4, "f4"),
+    "float64": (8, "f8"),
+}
+DESCRIPTION_EXTENSION = ".json"
+
+
+def file_hash(path, chunk_size=2**20):
+    """
+    Returns the SHA-256 hash of the contents of a file, reading it in chunks
+
+    Parameters:
+    path(String): Path to the file
+    chunk_size(Int): Number of bytes read at a time
+
+    Returns:
+    String: The hash as a hexadecimal string
+
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _temporary(path):
+    # Temporary files are named after the process and thread writing them, so that parallel writers never share one
+    return "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+
+
+def _int24(raw, byteorder="<"):
+    # Turns an array of 3 byte samples (..., 3) into int32, extending the sign of the highest byte
+    raw = raw if byteorder == "<" else raw[..., ::-1]
+    values = raw[..., 0].astype(np.int32)
+    values |= raw[..., 1].astype(np.int32) << 8
+    values |= raw[..., 2].astype(np.int32) << 16
+    return (values ^ 0x800000) - 0x800000
+
+
+class Recording:
+    """
+    A memory mapped binary file of interleaved samples of several channels
+
+    Attributes:
+    path(String): Path of the binary file
+    columns(List): Name of every channel, in the order they are interleaved
+    sample_format(String): One of SAMPLE_FORMATS
+    scale(Float): Factor turning the raw samples into physical units, applied by read() and iter_blocks()
+    offset(Int): Number of header bytes before the first sample
+    byteorder(String): "<" for little endian or ">" for big endian samples
+    raw(np.memmap): The samples as frames x channels (frames x channels x 3 bytes for int24), read only
+
+    Example:
+    recording = Recording("capture.bin", ["VibraX", "VibraY"], "int16", scale=1 / 8192)
+    for block in recording.iter_blocks():
+        averager.update(block)
+
+    """
+
+    def __init__(self, path, columns, sample_format="float64", scale=1.0, offset=0, byteorder="<"):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError("Unknown sample format '{}', use one of: {}".format(
+                sample_format, ", ".join(SAMPLE_FORMATS)))
+        if byteorder not in ("<", ">"):
+            raise ValueError("byteorder must be '<' or '>', got '{}'".format(byteorder))
+        self.path = path
+        self.columns = list(columns)
+        self.sample_format = sample_format
+        self.scale = scale
+        self.offset = offset
+        self.byteorder = byteorder
+
+        size, code = SAMPLE_FORMATS[sample_format]
+        frames = (os.path.getsize(path) - offset) // (size * len(self.columns))
+        if code is None:
+            shape, dtype = (frames, len(self.columns), size), np.uint8
+        else:
+            shape, dtype = (frames, len(self.columns)), np.dtype(byteorder + code)
+        if frames > 0:
+            self.raw = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+        else:
+            self.raw = np.empty(shape, dtype=dtype)      # An empty file can not be memory mapped
+
+    def __repr__(self):
+        return "Recording('{}', columns={}, format={}, samples={})".format(self.path, self.columns,
+                                                                          self.sample_format, self.samples)
+
+    @property
+    def samples(self):
+        """
+        Number of samples of every channel
+        """
+        return self.raw.shape[0]
+
+    def _indices(self, columns):
+        if columns is None:
+            return list(range(len(self.columns)))
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise ValueError("Columns {} are not in '{}', it has: {}".format(missing, self.path,
+                                                                           ", ".join(self.columns)))
+        return [self.columns.index(column) for column in columns]
+
+    def channel(self, column):
+        """
+        Returns the raw samples of one channel as a strided view of the file, nothing is copied or read
+
+        Explanation:
+        For int24 the view has a last axis of the 3 bytes of every sample, read() converts them.
+
+        """
+        return self.raw[:, self._indices([column])[0]]
+
+    def view(self, columns=None):
+        """
+        Returns the raw samples of the channels as a channels x samples strided view of the file
+
+        Explanation:
+        For float formats with a scale of 1 the view can be given to fft(), welch() or stft() as it is. The
+        samples are only read (and converted to float64) one batch of segments at a time.
+
+        """
+        if self.sample_format == "int24":
+            raise ValueError("int24 samples have no NumPy type, use read() or iter_blocks() to convert them")
+        indices = self._indices(columns)
+        view = self.raw.T
+        return view if indices == list(range(len(self.columns))) else view[indices]
+
+    def read(self, columns=None, start=0, stop=None, dtype=np.float64):
+        """
+        Returns the samples start to stop of the channels, converted to dtype and multiplied by the scale
+
+        Returns:
+        Array: channels x samples, a new array in memory
+
+        """
+        indices = self._indices(columns)
+        raw = self.raw[start:stop]
+        if self.sample_format == "int24":
+            raw = _int24(raw[:, indices], self.byteorder)
+        else:
+            raw = raw[:, indices]
+        samples = np.empty((len(indices), raw.shape[0]), dtype=dtype)
+        samples[...] = raw.T
+        if self.scale != 1:
+            samples *= self.scale
+        return samples
+
+    def iter_blocks(self, columns=None, block_size=2**20, max_samples=None, dtype=np.float64):
+        """
+        Reads the channels block by block, like ingest.iter_blocks(), see read()
+
+        Returns:
+        Generator: Arrays of channels x block_size samples, the last one can be shorter
+
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1, got {}".format(block_size))
+        end = self.samples if max_samples is None else min(max_samples, self.samples)
+        for start in range(0, end, block_size):
+            yield self.read(columns, start, min(start + block_size, end), dtype)
+
+    def describe(self):
+        """
+        Returns the description saved next to the file, see load_description()
+        """
+        return {"columns": self.columns, "format": self.sample_format, "scale": self.scale, "offset": self.offset,
+                "byteorder": self.byteorder}
+
+
+def load_description(path):
+    """
+    Opens a binary file as a Recording, with the layout given in "<path>.json"
+
+    Explanation:
+    The description needs columns and format. scale (1), offset (0) and byteorder ("<") are optional, any other
+    keys (e.g. the sampling frequency or the source of a sidecar) are ignored.
+
+    """
+    try:
+        with open(path + DESCRIPTION_EXTENSION) as file:
+            description = json.load(file)
+    except FileNotFoundError:
+        raise ValueError("'{}' has no description '{}', which gives its columns and sample format".format(
+            path, path + DESCRIPTION_EXTENSION)) from None
+    return Recording(path, description["columns"], description["format"], description.get("scale", 1.0),
+                     description.get("offset", 0), description.get("byteorder", "<"))
+
+
+def save_description(recording, **extra):
+    """
+    Writes the description of a Recording to "<path>.json", so that load_description() can open it again
+    """
+    temporary = _temporary(recording.path + DESCRIPTION_EXTENSION)
+    with open(temporary, "w") as file:
+        json.dump(dict(recording.describe(), **extra), file, indent=4)
+    os.replace(temporary, recording.path + DESCRIPTION_EXTENSION)    # Readers never see a half written file
+
+
+def convert(path, columns, destination=None, sample_format="float64", block_size=2**16, sheet=0):
+    """
+    Converts the columns of a csv or excel file once into a binary sidecar file, and opens it
+
+    Parameters:
+    path(String): The csv or excel file, see ingest.iter_blocks()
+    columns(List): Names of the columns to convert
+    destination(String): Path of the binary file. By default "<path>.bin" next to the file.
+    sample_format(String): "float64" keeps every value exactly, "float32" halves the size
+    block_size(Int): Number of rows parsed and written at a time
+    sheet(Int or String): Index or name of the excel sheet
+
+    Returns:
+    Recording: The converted file, memory mapped
+
+    Explanation:
+    The file is parsed block by block and every block is appended to the binary file, so the memory used does not
+    depend on the length of the file. The binary file is written under a temporary name and renamed when it is
+    complete, with its description, which records the sheet, size, modification time and SHA-256 hash of the source.
+
+    """
+    from vibration_analysis.ingest import iter_blocks    # ingest.py itself opens binary files with this module
+
+    if sample_format not in ("float32", "float64"):
+        raise ValueError("A sidecar holds float32 or float64 samples, got '{}'".format(sample_format))
+    destination = path + ".bin" if destination is None else destination
+    status = os.stat(path)
+    temporary = _temporary(destination)
+    with open(temporary, "wb") as file:
+        for block in iter_blocks(path, columns, block_size, None, sheet):
+            np.ascontiguousarray(block.T, dtype=SAMPLE_FORMATS[sample_format][1]).tofile(file)
+    os.replace(temporary, destination)
+
+    recording = Recording(destination, columns, sample_format)
+    save_description(recording, source={"path": os.path.abspath(path), "sheet": sheet, "size": status.st_size,
+                                        "mtime_ns": status.st_mtime_ns, "sha256": file_hash(path)})
+    return recording
+
+
+def _unchanged(path, recording, source):
+    # True if the source of a sidecar is the file it was converted from. A file with the same size but another
+    # modification time (copied or touched) is compared by its hash, and the new time is saved when it is the same.
+    status = os.stat(path)
+    if (source.get("size"), source.get("mtime_ns")) == (status.st_size, status.st_mtime_ns):
+        return True
+    if source.get("size") != status.st_size or source.get("sha256") != file_hash(path):
+        return False
+    save_description(recording, source=dict(source, mtime_ns=status.st_mtime_ns))
+    return True
+
+
+def open_recording(path, columns=None, sidecar_dir=None, sample_format="float64", sheet=0):
+    """
+    Opens a binary file, or the binary sidecar of a csv or excel file, as a memory mapped Recording
+
+    Parameters:
+    path(String): A binary file (see RAW_EXTENSIONS) with its description, or a csv or excel file
+    columns(List): Columns a csv or excel file is converted with. Not needed for binary files.
+    sidecar_dir(String): Folder of the sidecar files. By default they are written next to the csv or excel files.
+    sample_format(String): Sample format of a new sidecar, see convert()
+    sheet(Int or String): Index or name of the excel sheet
+
+    Returns:
+    Recording: The memory mapped samples
+
+    Explanation:
+    A csv or excel file is converted the first time it is opened. The sidecar is used as long as the file is
+    unchanged: it keeps its size and modification time, or its SHA-256 hash when only the time has changed. A sidecar
+    without all the columns is converted again with its columns and the new ones, so that all of them hold the same
+    rows. A changed file is converted again with the given columns only.
+
+    """
+    if path.lower().endswith(RAW_EXTENSIONS):
+        return load_description(path)
+    if columns is None:
+        raise ValueError("The columns to convert '{}' with are needed".format(path))
+
+    destination = path + ".bin"
+    if sidecar_dir is not None:
+        os.makedirs(sidecar_dir, exist_ok=True)
+        destination = os.path.join(sidecar_dir, os.path.basename(destination))
+    try:
+        with open(destination + DESCRIPTION_EXTENSION) as file:
+            source = json.load(file).get("source", {})
+        recording = load_description(destination)
+        if source.get("sheet", 0) == sheet and _unchanged(path, recording, source):
+            if set(columns) <= set(recording.columns):
+                return recording
+            columns = recording.columns + [column for column in columns if column not in recording.columns]
+    except (OSError, ValueError, KeyError):
+        pass                                             # No usable sidecar yet
+    return convert(path, columns, destination, sample_format, sheet=sheet)
@@ -0,0 +1,244 @@
+"""
+Averaged spectra of long recordings
+
+The scripts calculate the power spectrum from a single FFT of the first length_fixed samples. That periodogram is
+noisy (every bin has an error as large as its own value) and the rest of the recording is never looked at.
+
+Welch's method splits the whole recording into overlapping segments, applies a window to each, and averages their
+power spectra. The noise of the average falls with the number of segments.
+
+    1. Segments are strided views of the signal, no samples are copied to cut them
+    2. A batch of segments of all the channels is transformed with a single rfft() call
+    3. Their power is added into a running sum, the spectra of the segments are never kept
+
+The Welch class can be fed a recording block by block (see ingest.iter_blocks), welch() does the whole signal at once.
+
+Machines whose speed changes during a test (run up, coast down) need a spectrum for every moment instead of one
+average. stft() keeps the spectrum of every segment as one row of a time x frequency matrix (a spectrogram), using
+the same strided segments and batched transforms.
+
+Both accept memory mapped recordings (see recording.py) larger than the memory: welch() feeds the signal to Welch a
+block at a time, and stft() only converts the segments of one batch to floats, so only those samples are read.
+
+"""
+
+import numpy as np                                       # To cut segments and average their spectra
+
+from vibration_analysis.fourier import rfft
+from vibration_analysis.preprocess import trend
+from vibration_analysis.windows import window_table
+
+
+_BATCH_BYTES = 2**22                                     # Size of the segments transformed in one rfft() call
+_BLOCK_SAMPLES = 2**20                                   # Samples of every channel welch() converts at a time
+SCALINGS = ("density", "spectrum")
+
+
+class Welch:
+    """
+    Running average of the power spectra of overlapping segments (Welch's method)
+
+    Attributes:
+    segment_length(Int): Number of samples in every segment
+    n(Int): Length of the FFT of every segment, the segment is zero padded to it. By default segment_length.
+    step(Int): Number of samples between the starts of two segments
+    fs(Float): Sampling frequency of the signal
+    scaling(String): "density" for a power spectral density in g^2/Hz,
+                     "spectrum" for the power of every bin in g^2
+    window(Array): Window applied to every segment, see windows.py
+    detrend(String or Int): Trend removed from every segment before the window, see preprocess.DETREND_MODES
+    fold(Bool): True adds the power of the negative frequencies to their positive bins (every bin but 0 Hz and Fs/2
+                is doubled), the usual one sided spectrum. False keeps the power of every bin of the rfft, the scale
+                of the scripts' power_fourier_x: a sine of amplitude A gives (A/2)^2 with "spectrum", not A^2/2.
+    segments(Int): Number of segments averaged so far
+
+    Example:
+    averager = Welch(1024, overlap=0.5, fs=1)
+    for block in iter_blocks("Vibration Data.xlsx", ["VibraX", "VibraY"]):
+        averager.update(block)
+    psd_x, psd_y = averager.psd
+
+    """
+
+    def __init__(self, segment_length, overlap=0.5, fs=1.0, scaling="density", window="hann", detrend="constant",
+                 fold=True, n=None):
+        n = segment_length if n is None else n
+        if n < segment_length:
+            raise ValueError("n must be at least the segment length {}, got {}".format(segment_length, n))
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be at least 0 and less than 1, got {}".format(overlap))
+        if scaling not in SCALINGS:
+            raise ValueError("Unknown scaling '{}', use one of: {}".format(scaling, ", ".join(SCALINGS)))
+        self.segment_length = segment_length
+        self.n = n
+        self.step = max(1, int(round(segment_length * (1 - overlap))))
+        self.fs = fs
+        self.scaling = scaling
+        self.segments = 0
+        self.window = window_table(window, segment_length)
+        self.detrend = detrend
+        self.fold = fold
+        self._pending = None                             # Samples which are not yet part of a whole segment
+        self._power = None                               # Running sum of |X|^2 of every segment
+        self._single_channel = None
+
+    def update(self, samples):
+        """
+        Adds the next samples of the recording to the average
+
+        Parameter:
+        samples(Array): The next samples, a 1-D array for one channel or channels x samples.
+                        Every call must have the same number of channels.
+
+        """
+        samples = np.asarray(samples, dtype=float)
+        if self._single_channel is None:
+            self._single_channel = samples.ndim == 1
+        samples = np.atleast_2d(samples)
+        if self._pending is not None:
+            samples = np.concatenate((self._pending, samples), axis=1)
+
+        count = 0 if samples.shape[1] < self.segment_length else \
+            (samples.shape[1] - self.segment_length) // self.step + 1
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.segment_length, axis=1)[:, ::self.step]
+            if self._power is None:
+                self._power = np.zeros((samples.shape[0], self.n // 2 + 1))
+            batch = max(1, _BATCH_BYTES // (16 * self.segment_length * samples.shape[0]))
+            for start in range(0, count, batch):
+                segments = frames[:, start:start + batch]
+                if self.detrend is not None:
+                    segments = segments - trend(segments, self.detrend)
+                segments = segments * self.window
+                if self.n > self.segment_length:
+                    padded = np.zeros(segments.shape[:-1] + (self.n,))
+                    padded[..., :self.segment_length] = segments
+                    segments = padded
+                spectra = rfft(segments)
+                self._power += (spectra.real ** 2 + spectra.imag ** 2).sum(axis=1)
+            self.segments += count
+        self._pending = samples[:, count * self.step:].copy()   # Copied, so the caller's block can be freed
+
+    @property
+    def frequencies(self):
+        """
+        Frequencies of the bins of psd, from 0 Hz to fs/2
+        """
+        return np.arange(self.n // 2 + 1) * self.fs / self.n
+
+    @property
+    def psd(self):
+        """
+        The averaged one sided spectrum, an array of n // 2 + 1 bins (channels x bins for more channels)
+        """
+        if not self.segments:
+            raise ValueError("No complete segment of {} samples has been added yet".format(self.segment_length))
+        if self.scaling == "density":
+            scale = 1 / (self.fs * (self.window ** 2).sum())
+        else:
+            scale = 1 / self.window.sum() ** 2
+        psd = self._power * (scale / self.segments)
+        if self.fold:
+            last = -1 if self.n % 2 == 0 else None       # The Fs/2 bin has no mirror image to fold in
+            psd[:, 1:last] *= 2
+        return psd[0] if self._single_channel else psd
+
+
+def welch(x, segment_length=1024, overlap=0.5, fs=1.0, scaling="density", window="hann", detrend="constant",
+          fold=True, n=None):
+    """
+    Calculates the averaged power spectrum of a signal with Welch's method
+
+    Parameters:
+    x(Array): The signal, a 1-D array or channels x samples
+    segment_length(Int): Number of samples in every segment, the length of every FFT
+    overlap(Float): Fraction of a segment shared with the next one, 0.5 for 50%
+    fs(Float): Sampling frequency of the signal
+    scaling(String): "density" (g^2/Hz) or "spectrum" (g^2 per bin)
+    window(String or Array): Name of the window (see windows.WINDOWS) or its values
+    detrend(String or Int): Trend removed from every segment, see preprocess.DETREND_MODES
+    fold(Bool): False for the unfolded power of every bin, the scale of the scripts' power spectrum, see Welch
+    n(Int): Length of the FFT of every segment, zero padded. By default segment_length.
+
+    Returns:
+    Tuple: (frequencies, psd), psd has n // 2 + 1 bins for every channel
+
+    Explanation:
+    Every segment has its trend (by default its mean) removed and is multiplied with the window (Hann by default)
+    before its FFT. The one sided power of all the segments is averaged. With 50% overlap, a recording of N samples
+    gives about 2N / segment_length segments, and the variance of every bin falls by about that factor compared to a
+    single periodogram.
+
+    The signal is converted to floats _BLOCK_SAMPLES samples at a time, so x can be a memory mapped view (see
+    recording.Recording.view()) of a recording larger than the memory.
+
+    """
+    averager = Welch(segment_length, overlap, fs, scaling, window, detrend, fold, n)
+    x = np.asarray(x)
+    for start in range(0, max(x.shape[-1], 1), _BLOCK_SAMPLES):
+        averager.update(x[..., start:start + _BLOCK_SAMPLES])
+    return averager.frequencies, averager.psd
+
+
+def stft(x, segment_length=1024, hop=None, fs=1.0, window="hann", out=None, detrend=None):
+    """
+    Calculates the Short-Time Fourier Transform of a signal, the spectrum of every segment over time
+
+    Parameters:
+    x(Array): The signal, a 1-D array or channels x samples
+    segment_length(Int): Number of samples in every segment, the length of every FFT
+    hop(Int): Number of samples between the starts of two segments. By default a quarter of a segment.
+    fs(Float): Sampling frequency of the signal
+    window(String or Array): Name of the window applied to every segment (see windows.WINDOWS), or its values
+    out(Array): Complex array the spectra are written into, e.g. a memory mapped .npy file for long recordings
+    detrend(String or Int): Trend removed from every segment before the window, see preprocess.DETREND_MODES.
+                            None transforms the segments as they are.
+
+    Returns:
+    Tuple: (times, frequencies, spectra)
+        times(Array): Time of the centre of every segment in seconds
+        frequencies(Array): Frequency of every bin, from 0 Hz to fs/2
+        spectra(Array): Complex array of segments x bins (channels x segments x bins for more channels)
+
+    Explanation:
+    The segments are strided views of the signal, so cutting them copies nothing. They are windowed and transformed
+    in batches of all channels with one rfft() call per batch, written straight into the preallocated result.
+    Integer or memory mapped signals are only converted to floats one batch at a time.
+
+    """
+    x = np.asarray(x)
+    hop = hop or max(1, segment_length // 4)
+    if x.shape[-1] < segment_length:
+        raise ValueError("The signal has {} samples, fewer than one segment of {}".format(x.shape[-1], segment_length))
+    window = window_table(window, segment_length)
+
+    frames = np.lib.stride_tricks.sliding_window_view(x, segment_length, axis=-1)[..., ::hop, :]
+    count = frames.shape[-2]
+    shape = frames.shape[:-1] + (segment_length // 2 + 1,)
+    if out is not None and out.shape != shape:
+        raise ValueError("out has the shape {}, but {} is needed".format(out.shape, shape))
+    spectra = np.empty(shape, dtype=complex) if out is None else out
+    batch = max(1, _BATCH_BYTES // (16 * segment_length * max(1, x.size // x.shape[-1])))
+    for start in range(0, count, batch):
+        segments = frames[..., start:start + batch, :]
+        if detrend is not None:
+            segments = segments - trend(segments, detrend)
+        spectra[..., start:start + batch, :] = rfft(segments * window)
+
+    times = (np.arange(count) * hop + segment_length / 2) / fs
+    frequencies = np.arange(segment_length // 2 + 1) * fs / segment_length
+    return times, frequencies, spectra
+
+
+def spectrogram(x, segment_length=1024, hop=None, fs=1.0, window="hann", detrend=None):
+    """
+    Returns the amplitude of every bin of every segment of the signal, see stft()
+
+    Returns:
+    Tuple: (times, frequencies, amplitudes). The amplitudes are |X| divided by the sum of the window, which is the
+           same |X| / n the scripts use for a single FFT, corrected for the window.
+
+    """
+    window = window_table(window, segment_length)
+    times, frequencies, spectra = stft(x, segment_length, hop, fs, window, detrend=detrend)
+    return times, frequencies, np.abs(spectra) / window.sum()
@@ -0,0 +1,141 @@
+"""
+Tracking the amplitude of a few known frequencies
+
+For monitoring a machine only a handful of frequencies are of interest (1x and 2x the shaft speed, the gear mesh
+frequency, ...), yet a full FFT calculates every bin from 0 Hz to Fs/2 again for every new block of samples.
+
+    1. dft_bins(): The transform at the given frequencies over one block of samples, a direct DFT at those frequencies
+    2. SlidingDFT: The amplitude of the given frequencies over the last window_length samples, updated with every new
+       sample or block of samples at a cost of O(1) per sample and frequency
+
+Both work on many channels at once (channels x samples), so hundreds of sensors can be tracked with a few array
+operations per block.
+
+    tracker = SlidingDFT([0.05, 0.1], window_length=1024, channels=2)
+    for block in iter_blocks("Vibration Data.xlsx", ["VibraX", "VibraY"], block_size=256):
+        tracker.update(block)
+        print(tracker.amplitudes)
+
+"""
+
+import numpy as np                                       # To update all the channels and frequencies together
+
+
+_CHUNK_BYTES = 2**22                                     # Size of the complex exponentials dft_bins() uses at a time
+
+
+def dft_bins(x, frequencies, fs=1.0):
+    """
+    Calculates the Fourier Transform of a signal at only the given frequencies
+
+    Parameters:
+    x(Array): The signal, a 1-D array or channels x samples
+    frequencies(List): Frequencies in Hz, they don't have to be on the bins of an FFT
+    fs(Float): Sampling frequency of the signal
+
+    Returns:
+    Array: Complex array of one value per frequency (channels x frequencies for more channels), with the same scale
+           as fft(x): divide the magnitude by the number of samples for the amplitude, like the scripts do.
+
+    Explanation:
+    This is a direct DFT at the given frequencies, O(n) per frequency instead of the O(n log n) of a whole FFT, done
+    as matrix products of the samples with the complex exponentials of all the frequencies. Goertzel's algorithm gets
+    the same sums with a recurrence over the samples, which would be a python loop per sample here. The samples are
+    taken _CHUNK_BYTES of exponentials at a time, and the exponentials of one chunk are reused for all the chunks,
+    shifted by the phase of the chunk's first sample, so the memory used does not grow with the number of samples.
+    It is cheaper than an FFT for up to about log2(n) frequencies.
+
+    """
+    x = np.asarray(x, dtype=float)
+    omega = 2 * np.pi * np.atleast_1d(np.asarray(frequencies, dtype=float)) / fs
+    n = x.shape[-1]
+    chunk = max(1, min(n, _CHUNK_BYTES // (16 * len(omega)))) if len(omega) else max(n, 1)
+    exponentials = np.exp(-1j * np.outer(np.arange(chunk), omega))
+    result = np.zeros(x.shape[:-1] + (len(omega),), dtype=complex)
+    for start in range(0, n, chunk):
+        part = x[..., start:start + chunk]
+        result += (part @ exponentials[:part.shape[-1]]) * np.exp(-1j * omega * start)
+    return result
+
+
+class SlidingDFT:
+    """
+    The Fourier Transform at a few frequencies over the last window_length samples, updated sample by sample
+
+    Attributes:
+    frequencies(Array): The tracked frequencies in Hz
+    window_length(Int): Number of samples the transform is calculated over, like length_fixed in the scripts
+    fs(Float): Sampling frequency of the signal
+    channels(Int): Number of channels fed to update()
+    samples(Int): Number of samples added so far
+    spectrum(Array): Complex transform at every frequency, channels x frequencies, same scale as fft()
+
+    Explanation:
+    With X(t) the transform of the window ending at sample t, moving the window by one sample removes x[t - N] and
+    adds x[t]:
+        X(t) = exp(j w) * (X(t - 1) - x[t - N]) + exp(-j w (N - 1)) * x[t]
+    which is O(1) per sample and frequency, independent of N. A block of B samples is added with one matrix product
+    of its samples (and the B samples leaving the window) with the B powers of exp(j w). The last N samples are kept
+    in a ring buffer. Until N samples have been added, the missing ones count as zeros.
+
+    """
+
+    def __init__(self, frequencies, window_length, fs=1.0, channels=1):
+        if window_length < 1:
+            raise ValueError("window_length must be at least 1, got {}".format(window_length))
+        self.frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        self.window_length = window_length
+        self.fs = fs
+        self.channels = channels
+        self.samples = 0
+        self.spectrum = np.zeros((channels, len(self.frequencies)), dtype=complex)
+        self._omega = 2 * np.pi * self.frequencies / fs
+        self._entry = np.exp(-1j * self._omega * (window_length - 1))   # Weight of a sample entering the window
+        self._exit = np.exp(1j * self._omega)                            # Weight of a sample leaving the window
+        self._history = np.zeros((channels, window_length))             # Ring buffer of the last window_length samples
+        self._position = 0                                              # Oldest sample of the ring buffer
+        self._powers = {}                                               # exp(j w (B - 1 - i)) for every block size B
+
+    def _rotations(self, size):
+        powers = self._powers.get(size)
+        if powers is None:
+            powers = np.exp(1j * np.outer(np.arange(size - 1, -1, -1), self._omega))
+            self._powers = {size: powers}                # Only the last block size is kept, it rarely changes
+        return powers
+
+    def update(self, samples):
+        """
+        Adds the next samples and moves the window to end at the last of them
+
+        Parameter:
+        samples(Array): channels x samples, or a 1-D array of samples for a single channel. A single new sample of
+                        every channel is an array of channels x 1.
+
+        Returns:
+        Array: The amplitudes after the last sample, see the amplitudes property
+
+        """
+        samples = np.asarray(samples, dtype=float)
+        samples = samples.reshape(1, -1) if samples.ndim == 1 else samples
+        if samples.shape[0] != self.channels:
+            raise ValueError("Expected {} channels, got {}".format(self.channels, samples.shape[0]))
+        # Blocks longer than the window are split, so that the samples leaving the window are all in the ring buffer
+        for start in range(0, samples.shape[1], self.window_length):
+            block = samples[:, start:start + self.window_length]
+            size = block.shape[1]
+            slots = (self._position + np.arange(size)) % self.window_length
+            powers = self._rotations(size)
+            rotation = np.exp(1j * self._omega * size)
+            self.spectrum = self.spectrum * rotation + block @ powers * self._entry \
+                - self._history[:, slots] @ powers * self._exit
+            self._history[:, slots] = block
+            self._position = (self._position + size) % self.window_length
+            self.samples += size
+        return self.amplitudes
+
+    @property
+    def amplitudes(self):
+        """
+        Amplitude of every tracked frequency, |X| / window_length like the scripts' FFT plots (channels x frequencies)
+        """
+        return np.abs(self.spectrum) / self.window_length
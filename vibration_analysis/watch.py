@@ -0,0 +1,163 @@
+"""
+Watch folder service
+
+Every run of 'FFT v5.py' starts a new python, imports pandas and Bokeh, builds its FFT plans and parses its excel
+file before any analysis is done. This service runs for as long as it is needed instead:
+
+    1. The input folder is scanned every poll_interval seconds for new or changed vibration data files
+    2. A file is queued once its size and modification time have stopped changing (it is completely copied)
+    3. A pool of worker threads analyses the queued files with pipeline.analyse_file(), each into its own
+       Output Files/<time>/Excel|Graph folder
+
+The workers are threads of the same process, so the FFT plans (plan.py), window tables (windows.py) and the parsed
+file cache (cache.py) stay warm from one file to the next. The heavy NumPy work releases the GIL.
+
+    python -m vibration_analysis.watch "Vibration Data/" --workers 4
+
+Stop it with Ctrl+C, the files being analysed are finished first.
+
+"""
+
+import argparse                                          # To read the options from the command line
+from collections import deque                            # To keep the results of the last files only
+from concurrent.futures import ThreadPoolExecutor        # To analyse several files at the same time
+import os                                                # To scan the input folder
+import threading                                         # To stop the service from another thread
+import traceback                                         # To report a file which can not be analysed
+
+from vibration_analysis.cli import add_analysis_options, analysis_settings
+from vibration_analysis.ingest import RAW_EXTENSIONS    # Binary recordings, read once their "<file>.json" exists
+from vibration_analysis.pipeline import analyse_file
+
+
+EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv", ".txt")  # Files which ingest.iter_blocks() can read
+
+
+class FolderWatcher:
+    """
+    Analyses every vibration data file which appears (or changes) in a folder
+
+    Attributes:
+    input_path(String): The folder which is watched, not including its sub folders
+    workers(Int): Number of files analysed at the same time
+    poll_interval(Float): Seconds between two scans of the folder
+    settings(Dict): Keyword arguments passed to pipeline.analyse_file(), e.g. output_path, length_fixed, window_type
+    results(Deque): The summary returned by analyse_file() for each of the last keep_results files, or file and
+                    error for the failed ones. The older ones are dropped, the service may run for months.
+
+    Example:
+    watcher = FolderWatcher("Vibration Data/", workers=4, output_path="Output Files/", cache_dir="Cache/")
+    watcher.run()                                        # Until Ctrl+C or watcher.stop()
+
+    """
+
+    def __init__(self, input_path, workers=2, poll_interval=1.0, existing=True, keep_results=1000, **settings):
+        self.input_path = input_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settings = settings
+        self.results = deque(maxlen=keep_results)
+        self._seen = {}                                  # Path -> (size, mtime) the file was last queued with
+        self._pending = {}                               # Path -> (size, mtime) of the last scan, until it is stable
+        self._stopped = threading.Event()
+        if not existing:
+            self._seen = dict(self._scan())              # Files already in the folder are left alone
+
+    def _wanted(self, entry):
+        # Data files, without Excel's lock files (~$...), binary files still missing their description, and the
+        # binary sidecars of csv and excel files (recording.convert()), whose source is analysed already
+        name = entry.name.lower()
+        if not entry.is_file() or name.startswith("~$"):
+            return False
+        if name.endswith(RAW_EXTENSIONS):
+            source = os.path.splitext(name)[0]
+            return not source.endswith(EXTENSIONS) and os.path.exists(entry.path + ".json")
+        return name.endswith(EXTENSIONS)
+
+    def _scan(self):
+        with os.scandir(self.input_path) as entries:
+            for entry in entries:
+                if self._wanted(entry):
+                    status = entry.stat()
+                    yield entry.path, (status.st_size, status.st_mtime_ns)
+
+    def poll(self):
+        """
+        Scans the folder once and returns the files which are ready to be analysed
+
+        Explanation:
+        A new or changed file is only returned once two scans in a row saw the same size and modification time,
+        so a file which is still being copied into the folder is not read half written. Excel's lock files (~$...)
+        are skipped, and binary recordings wait for their description, see recording.py. Files which were removed
+        from the folder are forgotten.
+
+        """
+        ready = []
+        scanned = dict(self._scan())
+        for gone in [path for path in self._seen if path not in scanned]:
+            del self._seen[gone]
+        for gone in [path for path in self._pending if path not in scanned]:
+            del self._pending[gone]
+        for path, version in scanned.items():
+            if self._seen.get(path) == version:
+                continue
+            if self._pending.get(path) == version:
+                del self._pending[path]
+                self._seen[path] = version
+                ready.append(path)
+            else:
+                self._pending[path] = version
+        return ready
+
+    def _analyse(self, path):
+        try:
+            result = analyse_file(path, **self.settings)
+            print("Analysed '{}' into '{}'\n Peaks (Frq, Amp): {}".format(path, result["output"], result["peaks"]),
+                  flush=True)
+        except Exception as error:                       # One bad file must not stop the service
+            result = {"file": path, "error": repr(error)}
+            print("Could not analyse '{}':\n{}".format(path, traceback.format_exc()), flush=True)
+        self.results.append(result)
+        return result
+
+    def run(self):
+        """
+        Watches the folder and analyses its files until stop() is called or Ctrl+C is pressed
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis") as pool:
+            try:
+                while not self._stopped.is_set():
+                    for path in self.poll():
+                        pool.submit(self._analyse, path)
+                    self._stopped.wait(self.poll_interval)
+            except KeyboardInterrupt:
+                print("Stopping, waiting for the files being analysed", flush=True)
+
+    def stop(self):
+        """
+        Makes run() return after the files already queued are analysed
+        """
+        self._stopped.set()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Analyse every vibration data file put into a folder")
+    parser.add_argument("input_path", help="Folder to watch for new excel or csv files")
+    parser.add_argument("--output-path", default="Output Files/", help="Folder for the timestamped results")
+    parser.add_argument("--cache-dir", default="Cache/", help="Folder of the parsed file cache, '' to turn it off")
+    parser.add_argument("--workers", type=int, default=2, help="Number of files analysed at the same time")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between two scans of the folder")
+    parser.add_argument("--new-only", action="store_true", help="Leave the files already in the folder alone")
+    parser.add_argument("--no-graphs", action="store_true", help="Write only the spectra, without the plots")
+    add_analysis_options(parser)
+    options = parser.parse_args(arguments)
+
+    watcher = FolderWatcher(options.input_path, options.workers, options.poll_interval, not options.new_only,
+                            output_path=options.output_path, cache_dir=options.cache_dir or None,
+                            graphs=not options.no_graphs, **analysis_settings(options))
+    print("Watching '{}', press Ctrl+C to stop".format(options.input_path), flush=True)
+    watcher.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Window functions for the Fourier Transform
+
+The FFT treats the samples as one period of a repeating signal. When a vibration does not fit a whole number of
+times into the samples, the jump at the ends spreads its energy into the neighbouring bins (leakage), which widens
+every peak and lowers its height. Multiplying the samples by a window that falls to zero at both ends reduces that.
+
+    1. rectangular: No window, the sharpest peaks but the most leakage
+    2. hann: A good general purpose window, the default of the Welch and STFT functions
+    3. hamming: Lower first side lobe than hann, but its leakage falls off slower
+    4. blackman: Much lower leakage than hann, with wider peaks
+    5. flattop: Very wide peaks whose height is accurate to 0.01 dB, for reading amplitudes
+
+All windows are the periodic ("DFT even") versions. The tables are calculated once for every (type, length) and
+cached, and are applied with a single vectorised multiply.
+
+A window lowers the values of the spectrum, two correction factors undo that:
+
+    amplitude_correction = n / sum(w)                 # Peak heights (amplitude spectrum) are right again
+    energy_correction = sqrt(n / sum(w^2))            # Total power (RMS) is right again
+
+"""
+
+from functools import lru_cache                          # To calculate every window table only once
+
+import numpy as np                                       # To calculate and apply the windows
+
+
+# Coefficients a_k of the cosine sum w[n] = a_0 - a_1 * cos(2 pi n / N) + a_2 * cos(4 pi n / N) - ...
+WINDOWS = {
+    "rectangular": (1.0,),
+    "hann": (0.5, 0.5),
+    "hamming": (0.54, 0.46),
+    "blackman": (0.42, 0.5, 0.08),
+    "flattop": (0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368),
+}
+
+
+@lru_cache(maxsize=64)
+def get_window(name, length):
+    """
+    Returns the table of the given window type and length, calculated only once
+
+    Parameters:
+    name(String): One of WINDOWS - "rectangular", "hann", "hamming", "blackman" or "flattop"
+    length(Int): Number of samples
+
+    Returns:
+    Array: A read only NumPy array of length values. It is shared by every caller, use it but don't change it.
+
+    Example:
+    get_window("hann", 4) returns [0, 0.5, 1, 0.5]
+
+    """
+    if name not in WINDOWS:
+        raise ValueError("Unknown window '{}', use one of: {}".format(name, ", ".join(WINDOWS)))
+    phase = 2 * np.pi * np.arange(length) / length
+    window = np.zeros(length)
+    for k, coefficient in enumerate(WINDOWS[name]):
+        window += (-1) ** k * coefficient * np.cos(k * phase)
+    window.setflags(write=False)
+    return window
+
+
+def window_table(window, length):
+    """
+    Returns the values of a window given by name (see get_window) or as an array, checking its length
+    """
+    if isinstance(window, str):
+        return get_window(window, length)
+    window = np.asarray(window, dtype=float)
+    if len(window) != length:
+        raise ValueError("The window has {} values, but {} are needed".format(len(window), length))
+    return window
+
+
+def amplitude_correction(window, length):
+    """
+    Returns the factor that brings the peak heights of a windowed amplitude spectrum back to the real amplitudes
+
+    Parameters:
+    window(String or Array): Name of the window, or its values
+    length(Int): Number of samples
+
+    Returns:
+    Float: n / sum(w), 1 for the rectangular window, 2 for hann
+
+    """
+    return length / window_table(window, length).sum()
+
+
+def energy_correction(window, length):
+    """
+    Returns the factor that brings the total power (RMS) of a windowed spectrum back to that of the signal
+
+    Parameters:
+    window(String or Array): Name of the window, or its values
+    length(Int): Number of samples
+
+    Returns:
+    Float: sqrt(n / sum(w^2)), 1 for the rectangular window, 1.633 for hann
+
+    """
+    return float(np.sqrt(length / (window_table(window, length) ** 2).sum()))
+
+
+def apply_window(x, window, length=None):
+    """
+    Multiplies the signal (or every channel of it) with a window
+
+    Parameters:
+    x(Array): A 1-D signal, or channels x samples
+    window(String or Array): Name of the window, see WINDOWS, or its values
+    length(Int): Number of samples the window covers, from the start of the signal. By default the whole signal.
+                 Use the number of real samples when the signal is already zero padded.
+
+    Returns:
+    Array: A new NumPy array, the input is not changed
+
+    """
+    windowed = np.array(x, dtype=float)
+    length = windowed.shape[-1] if length is None else length
+    windowed[..., :length] *= window_table(window, length)
+    return windowed
@@ -0,0 +1,165 @@
+"""
+Writers for the spectra
+
+The scripts write the spectra with four DataFrame.to_excel() calls, one per column, into one sheet. For spectra of
+32k bins and more that is slow, the whole workbook is built in memory first, and the files are large. The writers
+here write all the columns in a single pass, straight from the arrays:
+
+    1. npz: NumPy's zipped archive of one array per column, np.load() reads it back
+    2. npy: One NumPy structured array with a named field per column
+    3. csv: Text with one row per bin, formatted a block of rows at a time
+    4. parquet: Columnar file for pandas, Spark, ... (needs pyarrow)
+    5. hdf5: One dataset per column (needs h5py)
+    6. excel: The sheet of the scripts, written row by row by xlsxwriter in constant memory mode
+
+Every writer takes the same arguments, so the formats are chosen by name:
+
+    write_results("Output Files/<time>/Excel/Fourier transformed Data", columns, ["npz", "excel"])
+
+Only the excel writer keeps the layout of the scripts (the bin number in the first column). All the other formats
+start with a Frequency column.
+
+"""
+
+import numpy as np                                       # To write the arrays
+
+
+def write_npz(path, columns):
+    """
+    Writes every column as an array into an uncompressed .npz archive
+
+    Parameters:
+    path(String): Path of the file, without the extension
+    columns(Dict): Name of every column mapped to its values, all of the same length
+
+    Returns:
+    String: Path of the file written
+
+    """
+    path += ".npz"
+    np.savez(path, **{name: np.asarray(values) for name, values in columns.items()})
+    return path
+
+
+def _table(columns):
+    # All the columns as one structured array, one field per column
+    names = list(columns)
+    table = np.empty(len(columns[names[0]]) if names else 0,
+                     dtype=[(name, np.asarray(columns[name]).dtype) for name in names])
+    for name in names:
+        table[name] = columns[name]
+    return table
+
+
+def write_npy(path, columns):
+    """
+    Writes the columns as one structured array into a .npy file, see write_npz() for the parameters
+    """
+    path += ".npy"
+    np.save(path, _table(columns))
+    return path
+
+
+def write_csv(path, columns, block_rows=65536):
+    """
+    Writes the columns as a csv file with a header row, see write_npz() for the parameters
+
+    Explanation:
+    The values are formatted with one % operation for a whole block of rows, instead of a call per value like
+    DataFrame.to_csv() or np.savetxt(). Every value is written with the digits needed to read it back exactly,
+    17 for float64 columns and 9 for float32 columns.
+
+    """
+    path += ".csv"
+    formats = ["%.9g" if np.asarray(column).dtype == np.float32 else "%.17g" for column in columns.values()]
+    values = np.column_stack([np.asarray(column, dtype=float) for column in columns.values()])
+    line = ",".join(formats) + "\n"
+    with open(path, "w") as file:
+        file.write(",".join(columns) + "\n")
+        for start in range(0, len(values), block_rows):
+            block = values[start:start + block_rows]
+            file.write((line * len(block)) % tuple(block.ravel()))
+    return path
+
+
+def write_parquet(path, columns):
+    """
+    Writes the columns as a parquet file (needs pyarrow), see write_npz() for the parameters
+    """
+    import pyarrow                                       # Only needed for parquet files
+    import pyarrow.parquet
+
+    path += ".parquet"
+    pyarrow.parquet.write_table(pyarrow.table({name: np.asarray(values) for name, values in columns.items()}), path)
+    return path
+
+
+def write_hdf5(path, columns):
+    """
+    Writes every column as a dataset of an HDF5 file (needs h5py), see write_npz() for the parameters
+    """
+    import h5py                                          # Only needed for HDF5 files
+
+    path += ".h5"
+    with h5py.File(path, "w") as file:
+        for name, values in columns.items():
+            file.create_dataset(name, data=np.asarray(values))
+    return path
+
+
+def write_excel(path, columns, sheet_name="sheet1"):
+    """
+    Writes the columns into an excel sheet, in the layout of the scripts: the bin number in the first column and
+    then the columns, without the Frequency column. See write_npz() for the parameters.
+
+    Explanation:
+    xlsxwriter's constant memory mode writes every row to disk as soon as the next one is started, so the memory
+    used does not grow with the length of the spectra.
+
+    """
+    import xlsxwriter                                    # Only needed for excel files
+
+    path += ".xlsx"
+    columns = {name: values for name, values in columns.items() if name != "Frequency"}
+    values = np.column_stack([np.asarray(column, dtype=float) for column in columns.values()]) \
+        if columns else np.empty((0, 0))
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        header = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+        worksheet.write_row(0, 1, list(columns), header)
+        for row, line in enumerate(values.tolist()):
+            worksheet.write_number(row + 1, 0, row, header)
+            worksheet.write_row(row + 1, 1, line)
+    finally:
+        workbook.close()
+    return path
+
+
+WRITERS = {
+    "npz": write_npz,
+    "npy": write_npy,
+    "csv": write_csv,
+    "parquet": write_parquet,
+    "hdf5": write_hdf5,
+    "excel": write_excel,
+}
+
+
+def write_results(path, columns, formats=("excel",)):
+    """
+    Writes the columns in every one of the given formats
+
+    Parameters:
+    path(String): Path of the files, without the extension, which every writer adds
+    columns(Dict): Name of every column mapped to its values, e.g. Frequency, Fourier_X, FourierPower_X, ...
+    formats(List): Names of the writers, see WRITERS
+
+    Returns:
+    List: Paths of the files written
+
+    """
+    unknown = [name for name in formats if name not in WRITERS]
+    if unknown:
+        raise ValueError("Unknown output formats {}, use some of: {}".format(unknown, ", ".join(WRITERS)))
+    return [WRITERS[name](path, columns) for name in formats]
@@ -0,0 +1,107 @@
+"""
+Zoom FFT of a narrow frequency band
+
+The bins of an FFT are Fs / n apart over the whole range from 0 Hz to Fs/2. To see a narrow band in more detail
+(e.g. the sidebands around a bearing defect frequency), the scripts can only zero pad the signal, which makes the
+transform of the whole range longer even though only a few of its bins are looked at.
+
+The chirp-z transform calculates the spectrum only at the frequencies asked for, bins equally spaced from f_low to
+f_high. It is the same convolution Bluestein's algorithm uses for odd lengths (see plan.BluesteinPlan), with the
+chirp stretched to the step between the bins and shifted to the start of the band:
+
+    X[k] = sum over n of x[n] * exp(-2j * pi * n * (f_low + k * step) / Fs)
+
+Its cost depends on the number of samples and bins, about two power of 2 transforms of n + bins - 1, and not on how
+fine the bins are. Zero padding to get the same bins would need a transform of Fs / step samples.
+
+    frequencies, spectrum = zoom_fft(vibra_x, 0.10, 0.15, bins=500)
+
+"""
+
+from functools import lru_cache                          # To calculate the chirps of a band only once
+
+import numpy as np                                       # To calculate the chirps and the convolution
+
+from vibration_analysis.fourier import fft
+
+
+@lru_cache(maxsize=16)
+def _chirp_tables(length, bins, start, step):
+    # Chirps of the chirp-z transform of length samples at bins frequencies start + k * step (in cycles per sample).
+    # The tables are read only, they are shared by every call with the same band.
+    inner_length = 1 << (length + bins - 2).bit_length()
+    n = np.arange(length)
+    k = np.arange(bins)
+    # n * n is exact as an integer, the phases are taken modulo 2 (in units of pi) to keep their precision
+    pre_chirp = np.exp(-1j * np.pi * ((2 * start * n + step * (n * n)) % 2))
+    post_chirp = np.exp(-1j * np.pi * ((step * (k * k)) % 2))
+    chirp_filter = np.zeros(inner_length, dtype=complex)
+    m = np.arange(max(length, bins))
+    chirp = np.exp(1j * np.pi * ((step * (m * m)) % 2))
+    chirp_filter[:bins] = chirp[:bins]
+    chirp_filter[inner_length - length + 1:] = chirp[1:length][::-1]
+    tables = pre_chirp, post_chirp, fft(chirp_filter)
+    for table in tables:
+        table.setflags(write=False)
+    return tables
+
+
+def czt(x, bins, start, step):
+    """
+    Calculates the chirp-z transform of a signal, its spectrum at equally spaced frequencies
+
+    Parameters:
+    x(Array): The signal, a 1-D array or channels x samples
+    bins(Int): Number of frequencies calculated
+    start(Float): First frequency, in cycles per sample (Hz / Fs)
+    step(Float): Step between the frequencies, in cycles per sample
+
+    Returns:
+    Array: Complex array of bins values for every channel. With start 0 and step 1 / n it is the same as fft(x).
+
+    Explanation:
+    With n * k = (n^2 + k^2 - (k-n)^2) / 2, the transform is a convolution of the signal multiplied by a chirp
+    with another chirp, which is done with power of 2 transforms (from the plan cache) of at least n + bins - 1.
+
+    """
+    x = np.asarray(x)
+    length = x.shape[-1]
+    if bins < 1 or length < 1:
+        raise ValueError("The signal and the number of bins must not be empty, got {} and {}".format(length, bins))
+    pre_chirp, post_chirp, chirp_filter = _chirp_tables(length, bins, float(start), float(step))
+
+    padded = np.zeros(x.shape[:-1] + (len(chirp_filter),), dtype=complex)
+    padded[..., :length] = x * pre_chirp
+    spectrum = fft(padded) * chirp_filter
+    # The inverse transform is done with the forward one, ifft(y) = conj(fft(conj(y))) / n
+    convolution = np.conj(fft(np.conj(spectrum))[..., :bins])
+    return convolution * (post_chirp / len(chirp_filter))
+
+
+def zoom_fft(x, f_low, f_high, bins=None, fs=1.0):
+    """
+    Calculates the spectrum of a signal in the band from f_low to f_high only
+
+    Parameters:
+    x(Array): The signal, a 1-D array or channels x samples
+    f_low(Float): Lowest frequency of the band in Hz
+    f_high(Float): Highest frequency of the band in Hz, included
+    bins(Int): Number of frequencies in the band. By default as many as the signal has samples.
+    fs(Float): Sampling frequency of the signal
+
+    Returns:
+    Tuple: (frequencies, spectrum). spectrum is complex, with the same scale as fft(x): divide its magnitude by
+           the number of samples for the amplitude, like the scripts do.
+
+    Explanation:
+    The bins can be much closer than Fs / n, but the spectrum between the usual bins is an interpolation, like zero
+    padding gives. Two vibrations closer than about Fs / n still need a longer recording to be told apart.
+
+    """
+    if not 0 <= f_low < f_high:
+        raise ValueError("The band must have 0 <= f_low < f_high, got {} to {}".format(f_low, f_high))
+    x = np.asarray(x)
+    bins = x.shape[-1] if bins is None else bins
+    step = (f_high - f_low) / max(bins - 1, 1)
+    frequencies = f_low + np.arange(bins) * step
+    return frequencies, czt(x, bins, f_low / fs, step / fs)